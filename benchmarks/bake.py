@@ -0,0 +1,53 @@
+"""
+Baking benchmark: measures time of building baked package
+from synthetic modules, so scaling by module count is tracked.
+
+Usage:
+    python benchmarks/bake.py [COUNT ...]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pybaked import BakedMaker  # noqa: E402
+
+DEFAULT_COUNTS = (1_000, 10_000, 50_000)
+
+
+def synthetic_maker(count: int) -> BakedMaker:
+    maker = BakedMaker()
+
+    for i in range(count):
+        maker.include_module(
+            f"sub{i % 100}.module{i}".encode(),
+            f"VALUE = {i}\n\n\ndef function():\n    return VALUE\n".encode(),
+        )
+
+    return maker
+
+
+def bench(count: int) -> float:
+    maker = synthetic_maker(count)
+
+    start = time.perf_counter()
+    maker.bytes()
+
+    return time.perf_counter() - start
+
+
+def main():
+    counts = [int(count) for count in sys.argv[1:]] or DEFAULT_COUNTS
+
+    for count in counts:
+        elapsed = bench(count)
+        print(
+            f"{count:>8} modules: {elapsed:8.3f}s "
+            f"({elapsed / count * 1e6:.2f}us per module)"
+        )
+
+
+if __name__ == "__main__":
+    main()
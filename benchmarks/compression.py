@@ -0,0 +1,104 @@
+"""
+Compression benchmark: compares baked file size and import latency
+of synthetic package for each codec.
+
+Usage:
+    python benchmarks/compression.py [COUNT]
+"""
+
+import importlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pybaked  # noqa: E402
+from pybaked import BakedMaker, protocol  # noqa: E402
+
+DEFAULT_COUNT = 1_000
+
+MODULE_TEMPLATE = '''"""
+Synthetic module {i}
+"""
+
+VALUE = {i}
+
+
+class Class{i}:
+    """
+    Docstring of the class {i}
+    """
+
+    def __init__(self, value: int = VALUE):
+        self.value = value
+
+    def method(self, other: int) -> int:
+        return self.value + other
+
+
+def function(argument: int) -> int:
+    return Class{i}(argument).method(VALUE)
+'''
+
+
+def available_codecs() -> list[str | None]:
+    codecs = [None]
+
+    for name, codec in protocol.CODECS.items():
+        try:
+            protocol.codec_module(codec)
+        except ImportError:
+            continue
+
+        codecs.append(name)
+
+    return codecs
+
+
+def bench(directory: Path, count: int, compression: str | None):
+    package_name = f"bench_{compression or 'raw'}"
+
+    sources = [MODULE_TEMPLATE.format(i=i).encode() for i in range(count)]
+
+    start = time.perf_counter()
+    maker = BakedMaker(compression=compression)
+    for i, source in enumerate(sources):
+        maker.include_module(f"module{i}".encode(), source)
+
+    path = maker.file(directory / package_name)
+    bake_time = time.perf_counter() - start
+
+    importlib.invalidate_caches()
+
+    start = time.perf_counter()
+    for i in range(count):
+        importlib.import_module(f"{package_name}.module{i}")
+    import_time = time.perf_counter() - start
+
+    return path.stat().st_size, bake_time, import_time
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+
+    pybaked.loader.init()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+
+        print(f"{count} modules")
+        for compression in available_codecs():
+            size, bake_time, import_time = bench(
+                Path(directory), count, compression
+            )
+            print(
+                f"{compression or 'none':>6}: {size / 1024:10.1f} KiB, "
+                f"bake {bake_time:7.3f}s, "
+                f"import {import_time / count * 1e6:8.1f}us per module"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Import benchmark: compares baked packages with plain source packages
+and zipimport on synthetic packages of varying size and depth.
+
+Measures bake time, archive size, cold (first import in a fresh
+interpreter) and warm (repeated import after sys.modules is cleared)
+import latency, finder overhead of the missing modules and peak RSS.
+Every import is measured in a separate interpreter, results are medians
+of the runs and are written as JSON, so they can be compared between
+releases.
+
+Usage:
+    python benchmarks/imports.py [-o results.json] [-r REPEAT] [-B]
+        [-s COUNTxDEPTH ...]
+"""
+
+import argparse
+import compileall
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+REPO = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO))
+
+import pybaked  # noqa: E402
+from pybaked import BakedMaker  # noqa: E402
+
+DEFAULT_SIZES = ("100x1", "1000x3", "5000x5")
+DEFAULT_REPEAT = 5
+DEFAULT_MISSES = 1_000
+
+MODES = ("plain", "zipimport", "baked")
+
+MODULE_TEMPLATE = '''"""
+Synthetic module {i}
+"""
+
+VALUE = {i}
+
+
+class Class{i}:
+    def __init__(self, value: int = VALUE):
+        self.value = value
+
+    def method(self, other: int) -> int:
+        return self.value + other
+
+
+def function(argument: int) -> int:
+    return Class{i}(argument).method(VALUE)
+'''
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    count, _, depth = size.partition("x")
+
+    return int(count), int(depth or 0)
+
+
+def generate(directory: Path, name: str, count: int, depth: int) -> list[str]:
+    """
+    Write synthetic package of ``count`` modules spread over chain of
+    ``depth`` nested subpackages
+
+    :return: names of the modules to import
+    """
+    parts = [name] + [f"sub{level}" for level in range(depth)]
+
+    for level in range(depth + 1):
+        package = directory.joinpath(*parts[: level + 1])
+        package.mkdir()
+        (package / "__init__.py").write_text(f"LEVEL = {level}\n")
+
+    modules = []
+    for i in range(count):
+        level = i % (depth + 1)
+        package = parts[: level + 1]
+
+        directory.joinpath(*package, f"module{i}.py").write_text(
+            MODULE_TEMPLATE.format(i=i)
+        )
+        modules.append(".".join(package + [f"module{i}"]))
+
+    return modules
+
+
+def make_zip(source: Path, name: str, path: Path, bytecode: bool):
+    if bytecode:
+        with zipfile.PyZipFile(path, "w", optimize=0) as f:
+            f.writepy(source / name)
+        return
+
+    with zipfile.ZipFile(path, "w") as f:
+        for file in sorted((source / name).rglob("*.py")):
+            f.write(file, file.relative_to(source).as_posix())
+
+
+def directory_size(path: Path) -> int:
+    return sum(
+        file.stat().st_size for file in path.rglob("*") if file.is_file()
+    )
+
+
+def child(mode: str, location: str, modules: list[str], misses: int) -> dict:
+    """
+    Measure imports of the modules inside this (fresh) interpreter
+    """
+    if mode == "baked":
+        pybaked.loader.init()
+
+    sys.path.insert(0, location)
+    importlib.invalidate_caches()
+
+    start = time.perf_counter()
+    for name in modules:
+        importlib.import_module(name)
+    cold = time.perf_counter() - start
+
+    top_level = modules[0].split(".", 1)[0]
+    for name in list(sys.modules):
+        if name == top_level or name.startswith(top_level + "."):
+            del sys.modules[name]
+
+    start = time.perf_counter()
+    for name in modules:
+        importlib.import_module(name)
+    warm = time.perf_counter() - start
+
+    # Missing top-level modules go through every finder of sys.meta_path
+    start = time.perf_counter()
+    for i in range(misses):
+        importlib.util.find_spec(f"missing_module_{i}")
+    miss = time.perf_counter() - start
+
+    result = {
+        "cold": cold,
+        "warm": warm,
+        "miss": miss / misses,
+        "max_rss_kib": None,
+    }
+
+    if mode == "baked":
+        finder = next(
+            finder
+            for finder in sys.meta_path
+            if isinstance(finder, pybaked.loader.BakedPathFinder)
+        )
+
+        start = time.perf_counter()
+        for i in range(misses):
+            finder.find_spec(f"missing_module_{i}", None)
+        result["finder_miss"] = (time.perf_counter() - start) / misses
+
+    try:
+        import resource
+    except ImportError:
+        return result
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kibibytes elsewhere
+    result["max_rss_kib"] = (
+        max_rss // 1024 if sys.platform == "darwin" else max_rss
+    )
+
+    return result
+
+
+def run_child(
+    mode: str, location: Path, modules_file: Path, misses: int, bytecode: bool
+) -> dict:
+    env = dict(os.environ)
+    if not bytecode:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+    output = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--child",
+            mode,
+            str(location),
+            str(modules_file),
+            str(misses),
+        ],
+        check=True,
+        capture_output=True,
+        env=env,
+    ).stdout
+
+    return json.loads(output)
+
+
+def median(runs: list[dict]) -> dict:
+    return {
+        key: (
+            None
+            if runs[0][key] is None
+            else statistics.median(run[key] for run in runs)
+        )
+        for key in runs[0]
+    }
+
+
+def bench(
+    directory: Path,
+    count: int,
+    depth: int,
+    repeat: int,
+    misses: int,
+    bytecode: bool,
+) -> dict:
+    name = f"bench_{count}x{depth}"
+
+    sources = directory / "sources"
+    archives = directory / "archives"
+    sources.mkdir()
+    archives.mkdir()
+
+    modules = generate(sources, name, count, depth)
+    modules_file = directory / "modules.json"
+    modules_file.write_text(json.dumps(modules))
+
+    if bytecode:
+        compileall.compile_dir(sources / name, quiet=1)
+
+    start = time.perf_counter()
+    baked = BakedMaker.from_package(sources / name, bytecode=bytecode).file(
+        archives / name
+    )
+    bake_time = time.perf_counter() - start
+
+    zip_path = directory / f"{name}.zip"
+    make_zip(sources, name, zip_path, bytecode)
+
+    locations = {"plain": sources, "zipimport": zip_path, "baked": archives}
+    result = {
+        "modules": count,
+        "depth": depth,
+        "bake_time": bake_time,
+        "size": {
+            "plain": directory_size(sources / name),
+            "zipimport": zip_path.stat().st_size,
+            "baked": baked.stat().st_size,
+        },
+    }
+
+    for mode in MODES:
+        runs = [
+            run_child(mode, locations[mode], modules_file, misses, bytecode)
+            for _ in range(repeat)
+        ]
+        result[mode] = median(runs)
+
+    return result
+
+
+def summary(result: dict):
+    print(
+        f"{result['modules']} modules, depth {result['depth']}: "
+        f"bake {result['bake_time']:.3f}s",
+        file=sys.stderr,
+    )
+
+    for mode in MODES:
+        measures = result[mode]
+        print(
+            f"{mode:>10}: {result['size'][mode] / 1024:10.1f} KiB, "
+            f"cold {measures['cold'] * 1e3:8.1f}ms, "
+            f"warm {measures['warm'] * 1e3:8.1f}ms, "
+            f"miss {measures['miss'] * 1e6:6.1f}us, "
+            f"rss {measures['max_rss_kib']} KiB",
+            file=sys.stderr,
+        )
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        mode, location, modules_file, misses = sys.argv[2:]
+        modules = json.loads(Path(modules_file).read_text())
+        print(json.dumps(child(mode, location, modules, int(misses))))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--size",
+        help="Synthetic package size as COUNTxDEPTH",
+        nargs="+",
+        default=DEFAULT_SIZES,
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        help="Runs of each import",
+        type=int,
+        default=DEFAULT_REPEAT,
+    )
+    parser.add_argument(
+        "-m",
+        "--misses",
+        help="Missing modules looked up in each run",
+        type=int,
+        default=DEFAULT_MISSES,
+    )
+    parser.add_argument(
+        "-B",
+        "--bytecode",
+        help="Import compiled bytecode instead of source",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-o", "--output", help="JSON results file (stdout by default)"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "bytecode": args.bytecode,
+        "repeat": args.repeat,
+        "results": [],
+    }
+
+    for size in args.size:
+        count, depth = parse_size(size)
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = bench(
+                Path(directory),
+                count,
+                depth,
+                args.repeat,
+                args.misses,
+                args.bytecode,
+            )
+
+        summary(result)
+        results["results"].append(result)
+
+    output = json.dumps(results, indent=2)
+
+    if args.output is None:
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Metadata benchmark: measures serialization and deserialization time
+of large metadata (file lists, dependency graphs).
+
+Usage:
+    python benchmarks/metadata.py [COUNT]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pybaked import protocol  # noqa: E402
+
+DEFAULT_COUNT = 100_000
+
+
+def synthetic_metadata(count: int) -> dict:
+    return {
+        "files": [f"package/module{i}.py" for i in range(count)],
+        "dependencies": {
+            f"module{i}": [f"module{i - 1}", f"module{i - 2}"]
+            for i in range(count)
+        },
+        "licenses": {f"dependency{i}": "GPL-3.0-only" for i in range(count)},
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+
+    metadata = synthetic_metadata(count)
+
+    start = time.perf_counter()
+    data = protocol.serialize(metadata)
+    serialize_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    protocol.deserialize(data)
+    deserialize_time = time.perf_counter() - start
+
+    print(
+        f"{count} elements ({len(data) / 1024 / 1024:.1f} MiB): "
+        f"serialize {serialize_time:.3f}s, "
+        f"deserialize {deserialize_time:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
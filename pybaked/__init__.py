@@ -1,3 +1,4 @@
 from .pybaker import BakedMaker
 from .bakedreader import BakedReader
-from . import loader, protocol
+from . import loader, profiling, protocol, resources, siteindex, tracing
+from .loader import preload
@@ -1,16 +1,44 @@
 import logging
+import mmap
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from datetime import datetime
-from functools import lru_cache
+from functools import cached_property
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Mapping, NamedTuple
 
 from . import protocol, BakedMaker
+from .profiling import ModuleProfile
 
 logger = logging.getLogger(__name__)
 
+# Kinds of the modules found by BakedReader.lookup
+MODULE = "module"
+PACKAGE = "package"
+
+
+class Lookup(NamedTuple):
+    # MODULE or PACKAGE
+    kind: str
+    # Module holding the source (package.__init__ for packages)
+    module_name: str
+    # Source offset and length (None for package without __init__ module,
+    # length is None for format version 1)
+    offset: int | None
+    length: int | None
+
 
 class BakedReader:
-    def __init__(self, path: str | Path):
+    def __init__(self, path: str | Path, use_mmap: bool = False):
+        """
+        :param path: Path to baked file
+        :param use_mmap: Map baked file into memory. Module bodies are read
+            as memoryview slices of the mapping without copying, and pages
+            are shared with other processes mapping the same file
+        """
         if not isinstance(path, Path):
             path = Path(path)
 
@@ -21,9 +49,28 @@ class BakedReader:
         ):
             raise ValueError(f"Baked file does not exist: {self._path}")
 
+        self._mmap = None
         self._file = self._path.open("rb")
 
-        data = self._read_next()
+        if use_mmap:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        # All reads go through the mapping in mmap mode. Reads are positional
+        # (mapping slices or os.pread) and never move the shared file
+        # position, so the reader may be used by several threads at once
+        self._source = self._mmap if use_mmap else self._file.fileno()
+
+        cursor = self._cursor()
+        self._version = protocol.read_version(cursor)
+
+        if self._version > protocol.VERSION:
+            raise ValueError(
+                f"Cannot decode baked file: unsupported version {self._version}"
+            )
+
+        data = self._read_next(cursor)
 
         if not data:
             raise ValueError(
@@ -33,41 +80,65 @@ class BakedReader:
         self._created = protocol.deserialize(data)
         logger.debug(f"Read creation date from {path} => {self._created}")
 
-        data = self._read_next()
+        data = self._read_next(cursor)
 
         if not data:
             raise ValueError("Cannot decode baked file: metadata not found")
 
-        self._metadata = protocol.deserialize(data)
-        logger.debug(f"Read metadata from {path} => {self._metadata}")
+        # Metadata values are deserialized only when they are accessed
+        self._metadata = protocol.deserialize_lazy(data)
+        logger.debug(f"Read metadata from {path} => {len(self._metadata)} keys")
 
-        self._modules_offset = self._file.tell()
+        # Top-level packages of the multi-package archive. Fragment names of
+        # such archive include the package name. None for single package
+        # archive: its package name is the file name
+        roots = self._metadata.get("--roots")
+        self._roots = None if roots is None else tuple(roots)
+
+        self._modules_offset = cursor.tell()
+
+    def _cursor(self, position: int = 0) -> protocol.Cursor:
+        """
+        File-like view of the baked file with its own position
+        """
+        return protocol.Cursor(self._source, position)
 
-    def _read_next(self) -> bytes | None:
+    @staticmethod
+    def _read_next(cursor: protocol.Cursor) -> bytes | None:
         """
         Read next data from the file
         """
-        length_bytes = self._file.read(8)
+        length_bytes = cursor.read(8)
         if len(length_bytes) != 8:
             return None
 
         length = int.from_bytes(length_bytes, "little")
 
-        return self._file.read(length)
+        return cursor.read(length)
 
-    def read_specific(self, offset: int) -> bytes:
-        self._file.seek(offset)
+    def read_specific(self, offset: int) -> bytes | memoryview:
+        """
+        Read fragment body at offset
+
+        :param offset: fragment body offset
+        :return: body bytes, or memoryview of the mapping in mmap mode
+        """
+        logger.debug("Reading data at %s from %s", offset, self._path)
 
-        logger.debug(f"Reading data at {offset} from {self._path}")
+        if self._mmap is not None:
+            return protocol.view_message(self._mmap, offset)
 
-        return self._read_next()
+        return self._read_next(self._cursor(offset))
 
     @property
     def path(self):
         return self._path
 
     @property
-    @lru_cache
+    def mapped(self) -> bool:
+        return self._mmap is not None
+
+    @cached_property
     def hash_match(self) -> bool | None:
         """
         Match hash written in metadata with real hash
@@ -80,20 +151,53 @@ class BakedReader:
         return self.real_hash == self._metadata["--fh"]
 
     @property
-    @lru_cache
+    def verified(self) -> bool:
+        """
+        Whole content of the file was read and matched its hash
+        (see hash_match), so fragments need no verification when read
+        """
+        return self.__dict__.get("hash_match") is True
+
+    @cached_property
+    def index_hash_match(self) -> bool | None:
+        """
+        Match hash written in metadata with hash of the fragment digests
+        stored in the index. Does not read module bodies: each body is
+        verified against its digest when it is read with verify=True.
+        Format version 1 has no digests - this is the same as hash_match
+
+        :return: None if no hash is present in metadata, bool - hash match
+        """
+        if "--fh" not in self._metadata:
+            return
+
+        if self._version == 1:
+            return self.hash_match
+
+        return self.index.hash() == self._metadata["--fh"]
+
+    @cached_property
     def real_hash(self) -> bytes:
         """
         Real content hash of the file
 
         :return: hash bytes
         """
-        self._file.seek(self._modules_offset)
+        # Bodies are hashed as views of the mapping without copying
+        buffer = self._mmap if self._mmap is not None else self._cursor()
 
-        return protocol.hash_fragments(self._file)
+        if self._version == 1:
+            return protocol.hash_fragments(buffer, self.index)
+
+        return protocol.hash_index(buffer, self.index)
 
     @property
-    def metadata(self) -> dict[str, Any]:
-        return self._metadata.copy()
+    def metadata(self) -> Mapping[str, Any]:
+        """
+        Read-only metadata of the package shared by all its modules.
+        Each value is deserialized when it is accessed for the first time
+        """
+        return self._metadata
 
     @property
     def created(self) -> datetime:
@@ -104,22 +208,305 @@ class BakedReader:
         return self._path.name[: -len(protocol.EXTENSION)]
 
     @property
-    @lru_cache
+    def roots(self) -> tuple[str, ...]:
+        """
+        Names of the top-level packages inside the baked file
+        """
+        if self._roots is None:
+            return (self.name,)
+
+        return self._roots
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @cached_property
+    def index(self) -> Mapping[bytes, int]:
+        """
+        Fragments index of the baked file
+
+        :return: mapping {raw_fragment_name: offset}
+        """
+        logger.debug(f"Reading index from {self._path}")
+
+        cursor = self._cursor(self._modules_offset)
+
+        if self._version == 1:
+            return dict(protocol.read_fragments(cursor))
+
+        return protocol.FragmentIndex.read(cursor)
+
+    def _fragment_name(self, module_name: str) -> bytes | None:
+        if self._roots is not None:
+            if module_name.split(".", 1)[0] not in self._roots:
+                return None
+
+            return module_name.encode()
+
+        prefix = self.name + "."
+
+        if not module_name.startswith(prefix):
+            return None
+
+        return module_name[len(prefix) :].encode()
+
+    def _module_name(self, fragment_name: bytes) -> str:
+        if self._roots is not None:
+            return fragment_name.decode()
+
+        return self.name + "." + fragment_name.decode()
+
+    def inner_path(self, module_name: str) -> str:
+        """
+        Path of the module inside the baked file (resources of the package
+        are located inside the same path)
+
+        :param module_name: module name (including package name)
+        :return: "/"-separated path without suffix
+        """
+        parts = module_name.split(".")
+
+        if self._roots is None:
+            parts = parts[1:]
+
+        return "/".join(parts)
+
+    def import_name(self, inner_path: str) -> str:
+        """
+        Module name of the path inside the baked file (inverse of inner_path)
+
+        :param inner_path: "/"-separated path without suffix
+        :return: module name (including package name)
+        """
+        parts = [part for part in inner_path.split("/") if part]
+
+        if self._roots is None:
+            parts.insert(0, self.name)
+
+        return ".".join(parts)
+
+    def find(self, module_name: str) -> int | None:
+        """
+        Find module source in the baked file
+
+        :param module_name: module name (including package name)
+        :return: source offset or None if module not found
+        """
+        name = self._fragment_name(module_name)
+
+        if name is None or not protocol.is_module_fragment(name):
+            return None
+
+        return self.index.get(name)
+
+    def find_bytecode(self, module_name: str) -> int | None:
+        """
+        Find module bytecode compiled for the running interpreter
+
+        :param module_name: module name (including package name)
+        :return: bytecode offset or None if bytecode not found
+        """
+        name = self._fragment_name(module_name)
+
+        if name is None or not protocol.is_module_fragment(name):
+            return None
+
+        return self.index.get(protocol.bytecode_fragment_name(name))
+
+    def find_resource(self, path: str) -> int | None:
+        """
+        Find resource (data file) in the baked file
+
+        :param path: resource path inside the baked file (see inner_path)
+        :return: resource offset or None if resource not found
+        """
+        return self.index.get(protocol.resource_fragment_name(path))
+
+    def locate(self, module_name: str) -> protocol.Location | None:
+        """
+        Find location of the module source: offset, length, flags (codec)
+        and digest of the stored body (length and digest are None
+        for format version 1)
+
+        :param module_name: module name (including package name)
+        :return: location or None if module not found
+        """
+        name = self._fragment_name(module_name)
+
+        if name is None or not protocol.is_module_fragment(name):
+            return None
+
+        return self._locate(name)
+
+    def locate_resource(self, path: str) -> protocol.Location | None:
+        """
+        Find location of the resource (see locate)
+
+        :param path: resource path inside the baked file (see inner_path)
+        :return: location or None if resource not found
+        """
+        return self._locate(protocol.resource_fragment_name(path))
+
+    def is_resource_dir(self, path: str) -> bool:
+        """
+        Check whether any resource is located inside the directory
+
+        :param path: directory path inside the baked file
+            (see inner_path, empty string is the root of the file)
+        """
+        prefix = protocol.resource_fragment_name(path + "/" if path else "")
+
+        if isinstance(self.index, protocol.FragmentIndex):
+            return self.index.has_prefix(prefix)
+
+        return any(name.startswith(prefix) for name in self.index)
+
+    def _locate(self, name: bytes) -> protocol.Location | None:
+        if self._version == 1:
+            offset = self.index.get(name)
+
+            if offset is None:
+                return None
+
+            # Format version 1 has no lengths, flags and digests in the index
+            return protocol.Location(offset, None, 0, None)
+
+        return self.index.locate(name)
+
+    def _read_fragment(
+        self,
+        name: bytes,
+        verify: bool = False,
+        profile: ModuleProfile | None = None,
+    ) -> bytes | memoryview | None:
+        if profile is not None:
+            started = time.perf_counter()
+
+        location = self._locate(name)
+
+        if location is None:
+            return None
+
+        body = self.read_specific(location.offset)
+
+        if profile is not None:
+            read_at = time.perf_counter()
+            profile.read += read_at - started
+            profile.bytes_read += len(body)
+
+        # Verify only the fragment being read
+        if (
+            verify
+            and location.digest is not None
+            and protocol.fragment_digest(body) != location.digest
+        ):
+            raise ValueError(
+                f"Fragment {name!r} of {self._path} does not match its digest"
+            )
+
+        if profile is not None:
+            verified_at = time.perf_counter()
+            profile.verify += verified_at - read_at
+
+        # Decompress only the fragment being read
+        body = protocol.decompress(body, location.flags)
+
+        if profile is not None:
+            profile.decompress += time.perf_counter() - verified_at
+
+        return body
+
+    def read(
+        self,
+        module_name: str,
+        verify: bool = False,
+        profile: ModuleProfile | None = None,
+    ) -> bytes | memoryview | None:
+        """
+        Read module source (decompressed if it is compressed)
+
+        :param module_name: module name (including package name)
+        :param verify: Verify source against its digest stored in the index
+            (raises ValueError if it does not match)
+        :param profile: Profile to record read, verify and decompress time in
+        :return: module source or None if module not found
+        """
+        name = self._fragment_name(module_name)
+
+        if name is None or not protocol.is_module_fragment(name):
+            return None
+
+        return self._read_fragment(name, verify, profile)
+
+    def read_bytecode(
+        self,
+        module_name: str,
+        verify: bool = False,
+        profile: ModuleProfile | None = None,
+    ) -> bytes | memoryview | None:
+        """
+        Read module bytecode compiled for the running interpreter
+
+        :param module_name: module name (including package name)
+        :param verify: Verify bytecode against its digest stored in the index
+            (raises ValueError if it does not match)
+        :param profile: Profile to record read, verify and decompress time in
+        :return: marshalled code or None if bytecode not found
+        """
+        name = self._fragment_name(module_name)
+
+        if name is None or not protocol.is_module_fragment(name):
+            return None
+
+        return self._read_fragment(
+            protocol.bytecode_fragment_name(name), verify, profile
+        )
+
+    def read_resource(
+        self,
+        path: str,
+        verify: bool = False,
+        profile: ModuleProfile | None = None,
+    ) -> bytes | memoryview | None:
+        """
+        Read resource (decompressed if it is compressed).
+        In mmap mode uncompressed resource is a slice of the mapping
+
+        :param path: resource path inside the baked file (see inner_path)
+        :param verify: Verify resource against its digest stored in the index
+            (raises ValueError if it does not match)
+        :param profile: Profile to record read, verify and decompress time in
+        :return: resource content or None if resource not found
+        """
+        return self._read_fragment(
+            protocol.resource_fragment_name(path), verify, profile
+        )
+
+    @cached_property
     def modules_dict(self) -> dict[str, int]:
         return dict(self.modules)
 
-    @property
-    @lru_cache
+    @cached_property
+    def fragments(self) -> list[tuple[bytes, int]]:
+        """
+        All fragments of the baked file including auxiliary ones
+
+        :return: tuples of raw fragment name and offset to its content
+        """
+        return list(self.index.items())
+
+    @cached_property
     def modules(self) -> list[tuple[str, int]]:
         found_modules = []
 
         logger.debug(f"Reading modules from {self._path}")
 
-        self._file.seek(self._modules_offset)
-        fragments = protocol.read_fragments(self._file)
+        for name, offset in self.fragments:
+            if not protocol.is_module_fragment(name):
+                continue
 
-        for name, offset in fragments:
-            found_modules.append((self.name + "." + name.decode(), offset))
+            found_modules.append((self._module_name(name), offset))
 
         logger.debug(
             f"Read {len(found_modules)} modules from {self._path}",
@@ -128,36 +515,409 @@ class BakedReader:
 
         return found_modules
 
-    @property
-    @lru_cache
-    def packages(self):
-        found_packages = []
+    @cached_property
+    def resources(self) -> list[str]:
+        """
+        Resources (data files) of the baked file
+
+        :return: resource paths inside the baked file (see inner_path)
+        """
+        return [
+            name[len(protocol.RESOURCE_TAG) :].decode()
+            for name, _ in self.fragments
+            if name.startswith(protocol.RESOURCE_TAG)
+        ]
+
+    @cached_property
+    def sources(self) -> dict[str, list]:
+        """
+        Sources tracked by the incremental build (see BakedMaker.incremental)
+
+        :return: dict {fragment_name: [mtime, size, digest, codec]},
+            empty if sources are not tracked
+        """
+        data = self._read_fragment(protocol.SOURCES_FRAGMENT)
+
+        if data is None:
+            return {}
+
+        return protocol.deserialize(data)
+
+    @cached_property
+    def bytecode_dict(self) -> dict[str, int]:
+        """
+        Modules that have bytecode compiled for the running interpreter
+
+        :return: dict {module_name: bytecode_offset}
+        """
+        found_bytecode = {}
+
+        tag = protocol.bytecode_fragment_name(b"")
+
+        for name, offset in self.fragments:
+            if not name.endswith(tag):
+                continue
+
+            found_bytecode[self._module_name(name[: -len(tag)])] = offset
+
+        logger.debug(
+            f"Found bytecode for {len(found_bytecode)} modules in {self._path}"
+        )
+
+        return found_bytecode
+
+    @cached_property
+    def _package_names(self) -> frozenset[str]:
+        found_packages = set()
 
         logger.debug(f"Defining packages for {self._path}")
 
         for name in self.modules_dict:
-            name = name.rsplit(".", 1)[0]
+            # All parents of the module are packages,
+            # parents of the known package are already added
+            while "." in name:
+                name = name.rsplit(".", 1)[0]
+
+                if name in found_packages:
+                    break
 
-            if name not in found_packages:
-                found_packages.append(name)
+                found_packages.add(name)
 
         logger.debug(
             f"Found {len(found_packages)} packages in {self._path}",
             extra={"packages": found_packages},
         )
 
-        return list(found_packages)
+        return frozenset(found_packages)
+
+    @cached_property
+    def packages(self) -> list[str]:
+        """
+        Packages of the baked file sorted by name (parents before children)
+        """
+        return sorted(self._package_names)
+
+    def is_package(self, module_name: str) -> bool:
+        """
+        Check whether module is a package of the baked file.
+        Looks up fragments of its submodules in the index
+        without listing the modules of the file
+
+        :param module_name: module name (including package name)
+        """
+        if self._version == 1:
+            return module_name in self._package_names
+
+        prefix = self._fragment_name(module_name + ".")
+
+        if prefix is None:
+            return False
+
+        # Fragment names of the single package archive do not include
+        # the package name: any module makes its root a package
+        if not prefix:
+            return self.index.has_modules()
+
+        return self.index.has_prefix(prefix)
+
+    def lookup(self, module_name: str) -> Lookup | None:
+        """
+        Find module or package in the baked file
+
+        :param module_name: module name (including package name)
+        :return: kind and location of the module source
+            (source of the package is its __init__ module)
+            or None if there is no such module or package
+        """
+        if self.is_package(module_name):
+            kind = PACKAGE
+            source_name = module_name + ".__init__"
+        else:
+            kind = MODULE
+            source_name = module_name
+
+        name = self._fragment_name(source_name)
+        location = None if name is None else self._locate(name)
+
+        if location is None:
+            if kind == MODULE:
+                return None
+
+            # Package without __init__ module
+            return Lookup(kind, source_name, None, None)
+
+        return Lookup(kind, source_name, location.offset, location.length)
+
+    def prefetch(self, module_names: Iterable[str]) -> int:
+        """
+        Read bodies (bytecode and source) of the modules into the page cache
+        ahead of their import. Kernel is advised to read them
+        (madvise or posix_fadvise), mapped bodies are read when advice is
+        not available
+
+        :param module_names: module names (including package name),
+            modules not in the baked file are skipped
+        :return: number of bytes prefetched
+        """
+        # Format version 1 has no lengths of the fragments
+        if self._version == 1:
+            return 0
+
+        ranges = []
+        for module_name in module_names:
+            # Packages are executed from their __init__ module
+            for source_name in (module_name, module_name + ".__init__"):
+                name = self._fragment_name(source_name)
+
+                if name is None or not protocol.is_module_fragment(name):
+                    continue
+
+                for fragment in (protocol.bytecode_fragment_name(name), name):
+                    location = self.index.locate(fragment)
+
+                    if location is not None:
+                        ranges.append(
+                            (
+                                location.offset,
+                                location.offset
+                                + protocol.LENGTH.size
+                                + location.length,
+                            )
+                        )
+
+        # Bodies placed close to each other (e.g. by layout)
+        # are prefetched at once
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start - merged[-1][1] < mmap.PAGESIZE:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        advise = getattr(self._mmap, "madvise", None)
+
+        for start, end in merged:
+            if advise is not None:
+                # Advised range must start at the page boundary
+                page_start = start - start % mmap.PAGESIZE
+                advise(mmap.MADV_WILLNEED, page_start, end - page_start)
+            elif hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(
+                    self.fileno(), start, end - start, os.POSIX_FADV_WILLNEED
+                )
+            elif self._mmap is not None:
+                self._mmap[start:end]
+
+        logger.debug("Prefetched %s ranges from %s", len(merged), self._path)
+
+        return sum(end - start for start, end in merged)
+
+    @cached_property
+    def compression(self) -> str | None:
+        """
+        Codec the fragments are compressed with (see protocol.CODECS)
+
+        :return: codec name or None if no fragment is compressed
+        """
+        # Format version 1 has no flags of the fragments
+        if self._version == 1:
+            return None
+
+        codecs = {codec: name for name, codec in protocol.CODECS.items()}
+
+        for _, location in self.index.locations():
+            codec = location.flags & protocol.CODEC_MASK
+
+            if codec:
+                return codecs.get(codec)
+
+        return None
 
     def to_maker(self) -> BakedMaker:
-        maker = BakedMaker("--fh" in self.metadata, self.metadata)
+        maker = BakedMaker(
+            "--fh" in self.metadata,
+            dict(self.metadata),
+            bool(self.bytecode_dict),
+            self.compression,
+            roots=None if self._roots is None else list(self._roots),
+        )
 
-        for module_name, source_offset in self.modules_dict.items():
+        for module_name in self.modules_dict:
             maker.include_module(
-                module_name[len(self.name) + 1 :].encode(),
-                self.read_specific(source_offset),
+                self._fragment_name(module_name),
+                bytes(self.read(module_name)),
             )
 
+        for path in self.resources:
+            maker.include_resource(path, bytes(self.read_resource(path)))
+
         return maker
 
-    def __del__(self):
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        """
+        Close the baked file (and its mapping)
+        """
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Module bodies are still referenced - the mapping
+                # is released with the last memoryview
+                pass
+
         self._file.close()
+
+    def __enter__(self) -> "BakedReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        # Reader may fail before the file is opened
+        if hasattr(self, "_file"):
+            self.close()
+
+
+# Registries of the process: their locks are recreated in the forked child,
+# as the lock may be held by another thread of the parent during the fork
+_registries: "weakref.WeakSet[ReaderRegistry]" = weakref.WeakSet()
+
+
+def _after_fork():
+    for registry in _registries:
+        registry._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class ReaderRegistry:
+    """
+    Shared readers of the baked files.
+    At most ``max_open`` readers are kept open: when the limit is reached,
+    the least recently used reader is closed. Reader is reopened when its
+    file is replaced or modified (inode or modification time changed).
+    Readers stay valid in the forked processes: they read the inherited
+    descriptors (or mappings) without the shared file position
+    """
+
+    logger = logger.getChild("ReaderRegistry")
+
+    def __init__(
+        self,
+        max_open: int = 64,
+        use_mmap: bool = True,
+        on_open: Callable[[BakedReader], None] | None = None,
+    ):
+        """
+        :param max_open: Maximal number of open readers
+        :param use_mmap: Map baked files into memory
+        :param on_open: Called with every reader opened by the registry
+            (including reopened ones)
+        """
+        if max_open < 1:
+            raise ValueError("Number of open readers must be positive")
+
+        self.max_open = max_open
+        self.use_mmap = use_mmap
+        self.on_open = on_open
+
+        # Path => reader and identity of the file it was opened for.
+        # Ordered from the least to the most recently used
+        self._readers: OrderedDict[
+            Path, tuple[BakedReader, tuple[int, int, int]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+        _registries.add(self)
+
+    def get(self, path: str | Path) -> BakedReader:
+        """
+        Get open reader of the baked file
+
+        :param path: path to baked file
+        :return: reader
+        """
+        path = Path(os.path.abspath(path))
+
+        stat = os.stat(path)
+        identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+        with self._lock:
+            entry = self._readers.get(path)
+
+            if entry is not None:
+                reader, opened_identity = entry
+
+                if opened_identity == identity:
+                    self._readers.move_to_end(path)
+                    return reader
+
+                self.logger.debug("Baked file %s changed - reopening", path)
+                del self._readers[path]
+                reader.close()
+
+            reader = BakedReader(path, use_mmap=self.use_mmap)
+            self._readers[path] = (reader, identity)
+
+            while len(self._readers) > self.max_open:
+                evicted_path, (evicted, _) = self._readers.popitem(last=False)
+                self.logger.debug("Closing reader of %s", evicted_path)
+                evicted.close()
+
+        if self.on_open is not None:
+            self.on_open(reader)
+
+        return reader
+
+    def reopen(self, reader: BakedReader) -> BakedReader:
+        """
+        Reader of the same baked file: the reader itself, or the reader
+        of the registry if it was closed (e.g. least recently used one)
+
+        :param reader: reader of the baked file
+        :return: open reader
+        """
+        if not reader.closed:
+            return reader
+
+        return self.get(reader.path)
+
+    def open_readers(self) -> list[BakedReader]:
+        """
+        Readers currently open, from the least to the most recently used
+        """
+        with self._lock:
+            return [reader for reader, _ in self._readers.values()]
+
+    def invalidate(self, path: str | Path | None = None):
+        """
+        Close reader of the baked file (or all readers)
+
+        :param path: path to baked file, None - all files
+        """
+        with self._lock:
+            if path is None:
+                entries = list(self._readers.values())
+                self._readers.clear()
+            else:
+                entry = self._readers.pop(Path(os.path.abspath(path)), None)
+                entries = [] if entry is None else [entry]
+
+        for reader, _ in entries:
+            reader.close()
+
+    def __contains__(self, path: str | Path) -> bool:
+        return Path(os.path.abspath(path)) in self._readers
+
+    def __len__(self) -> int:
+        return len(self._readers)
@@ -1,3 +1,4 @@
 from .read import read
 from .bake import bake
 from .unpack import unpack
+from .index import index
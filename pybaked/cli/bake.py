@@ -3,10 +3,15 @@ from argparse import ArgumentParser
 from pathlib import Path
 
 from . import colors
+from .. import protocol
 from .colors import cyan, green, red, blue, yellow, purple
 
 bake_parser = ArgumentParser()
-bake_parser.add_argument("package", help="Package to bake")
+bake_parser.add_argument(
+    "package",
+    help="Package to bake (several packages are baked into one file)",
+    nargs="+",
+)
 bake_parser.add_argument(
     "-o", "--output", help="Output file name", default=None, required=False
 )
@@ -17,6 +22,56 @@ bake_parser.add_argument(
     action="store_true",
     default=False,
 )
+bake_parser.add_argument(
+    "-B",
+    "--bytecode",
+    help="Include bytecode compiled for the current interpreter",
+    action="store_true",
+    default=False,
+)
+bake_parser.add_argument(
+    "-c",
+    "--compress",
+    help="Compress modules with the codec",
+    choices=list(protocol.CODECS),
+    required=False,
+    default=None,
+)
+bake_parser.add_argument(
+    "-r",
+    "--resources",
+    help="Include data files (all files except python modules)",
+    action="store_true",
+    default=False,
+)
+bake_parser.add_argument(
+    "-L",
+    "--lazy",
+    help="Execute modules on the first attribute access instead of import",
+    action="store_true",
+    default=False,
+)
+bake_parser.add_argument(
+    "-I",
+    "--incremental",
+    help="Previous baked file to copy unchanged modules from",
+    required=False,
+    default=None,
+)
+bake_parser.add_argument(
+    "-l",
+    "--layout",
+    help="Import trace file: traced modules are placed at the front of the file",
+    required=False,
+    default=None,
+)
+bake_parser.add_argument(
+    "-j",
+    "--jobs",
+    help="Number of processes reading and preparing modules",
+    type=int,
+    default=1,
+)
 bake_parser.add_argument(
     "--no-colors", help="Don't color output", action="store_true", default=False
 )
@@ -42,12 +97,20 @@ def bake():
     if args.no_colors:
         colors.USE_COLORS = False
 
-    package_path = Path(args.package)
+    package_paths = [Path(package) for package in args.package]
+
+    for package_path in package_paths:
+        if not package_path.is_dir():
+            print(red(f"Package {yellow(package_path)} not found"))
+            return -1
 
-    if not package_path.is_dir():
-        print(red(f"Package {yellow(args.package)} not found"))
+    if len(package_paths) > 1 and args.output is None:
+        print(red("Output file name is required to bake several packages"))
         return -1
 
+    package_path = package_paths[0]
+    packages = ", ".join(args.package)
+
     metadata = json.loads(args.metadata)
 
     if args.metadata_file is not None:
@@ -63,24 +126,62 @@ def bake():
 
         metadata = json.loads(mf.read_text())
 
+    if args.lazy:
+        metadata["--lazy"] = True
+
     from pybaked import BakedMaker
 
-    baker = BakedMaker.from_package(package_path, args.hash, metadata)
+    try:
+        if len(package_paths) == 1:
+            make, source = BakedMaker.from_package, package_path
+        else:
+            # Several packages are baked into multi-package archive
+            make, source = BakedMaker.from_packages, package_paths
+
+        baker = make(
+            source,
+            args.hash,
+            metadata,
+            args.bytecode,
+            args.compress,
+            args.jobs,
+            args.resources,
+        )
+    except ValueError as e:
+        print(red(f"Cannot bake package: {e.args[0]}"))
+        return -3
+
+    if args.incremental is not None:
+        baker.incremental(args.incremental)
+
+    if args.layout is not None:
+        from pybaked import tracing
+
+        layout = Path(args.layout)
+        if not layout.is_file():
+            print(red(f"Trace file {yellow(args.layout)} not found"))
+            return -2
+
+        # Baked package is imported by the name of the file
+        baker.layout(
+            tracing.read(layout),
+            Path(args.output or package_path).name.split(".", 1)[0],
+        )
 
     print(
         cyan(
-            f"Baking {yellow(args.package)} as {yellow(args.output or package_path.name)}..."
+            f"Baking {yellow(packages)} as {yellow(args.output or package_path.name)}..."
         ),
         flush=True,
         end="\r",
     )
 
-    filename = baker.file(args.output or package_path)
+    try:
+        filename = baker.file(args.output or package_path)
+    except ValueError as e:
+        print(red(f"Cannot bake package: {e.args[0]}"))
+        return -3
 
-    print(
-        green(
-            f"Baked package {yellow(args.package)} into file {cyan(filename)}"
-        )
-    )
+    print(green(f"Baked package {yellow(packages)} into file {cyan(filename)}"))
 
     return 0
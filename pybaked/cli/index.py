@@ -0,0 +1,54 @@
+from argparse import ArgumentParser
+from pathlib import Path
+
+from . import colors
+from .. import protocol
+from .colors import cyan, green, red, blue, yellow
+
+index_parser = ArgumentParser()
+index_parser.add_argument(
+    "directory",
+    help="Directory with baked packages",
+    nargs="?",
+    default=".",
+)
+index_parser.add_argument(
+    "--no-colors", help="Don't color output", action="store_true", default=False
+)
+
+
+def index():
+    args = index_parser.parse_args()
+
+    if args.no_colors:
+        colors.USE_COLORS = False
+
+    directory = Path(args.directory)
+
+    if not directory.is_dir():
+        print(red(f"Directory {yellow(args.directory)} not found"))
+        return -1
+
+    from pybaked import siteindex
+
+    print(cyan(f"Indexing {yellow(args.directory)}..."), flush=True, end="\r")
+
+    try:
+        data = siteindex.build(directory)
+    except ValueError as e:
+        print(red(f"Cannot index {yellow(args.directory)}: {e.args[0]}"))
+        return -2
+
+    filename = siteindex.write(directory, data)
+
+    print(
+        green(
+            f"Indexed {blue(len(data['archives']))} baked files "
+            f"({blue(len(data['packages']))} packages) into {cyan(filename)}"
+        )
+    )
+
+    for package, name in data["packages"].items():
+        print(f"\t- {yellow(package)} ({name[: -len(protocol.EXTENSION)]})")
+
+    return 0
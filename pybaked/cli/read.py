@@ -17,6 +17,13 @@ read_parser.add_argument(
     required=False,
     default=None,
 )
+read_parser.add_argument(
+    "--profile-import",
+    help="Import the package (or module passed with -m) "
+    "and print time spent on each baked module",
+    action="store_true",
+    default=False,
+)
 read_parser.add_argument(
     "--no-colors", help="Don't color output", action="store_true", default=False
 )
@@ -51,7 +58,7 @@ def format_metadata(metadata: dict[str, Any]) -> str:
 
 
 # noinspection PyPackageRequirements,PyUnresolvedReferences
-def format_modules(modules: Sequence[str]) -> str:
+def format_modules(modules: Sequence[str], strip_root: bool = True) -> str:
     try:
         from asciitree import LeftAligned
         from asciitree.drawing import BoxStyle, BOX_LIGHT
@@ -65,7 +72,7 @@ def format_modules(modules: Sequence[str]) -> str:
 
             for deep, part in enumerate(parts):
                 if deep == len(parts) - 1:
-                    real = module.split(".", 1)[1]
+                    real = module.split(".", 1)[1] if strip_root else module
                     part += f" ({yellow(real)})"
                 package = package.setdefault(purple(part), {})
 
@@ -77,8 +84,14 @@ def format_modules(modules: Sequence[str]) -> str:
     modules_formatted: dict[str, str] = {}
 
     for name in modules:
-        modules_formatted["/".join(map(purple, name.split(".")[1:]))] = yellow(
-            ".".join(name.split(".")[1:])
+        parts = name.split(".")
+
+        # Package name is omitted for single package files
+        if strip_root:
+            parts = parts[1:]
+
+        modules_formatted["/".join(map(purple, parts))] = yellow(
+            ".".join(parts)
         )
 
     return "\n".join(
@@ -86,10 +99,91 @@ def format_modules(modules: Sequence[str]) -> str:
     )
 
 
+def resolve_module(reader, module: str) -> str:
+    """
+    Prepend package name to the module name if it is omitted
+    """
+    if module.split(".", 1)[0] in reader.roots:
+        return module
+
+    return reader.name + "." + module
+
+
+def profile_import(package_path: Path, module: str | None) -> int:
+    import importlib
+    import sys
+    import time
+
+    from pybaked import BakedReader, loader, profiling
+
+    reader = BakedReader(package_path)
+
+    if module is None:
+        # Multi-package archive - import all its packages
+        names = list(reader.roots)
+    else:
+        names = [resolve_module(reader, module)]
+
+    profiles = []
+    profiling.add_hook(profiles.append)
+
+    sys.path.insert(0, str(package_path.parent.absolute()))
+    loader.init()
+
+    # Source package next to the baked file (default layout of baked-make)
+    # must not be found before the baked one
+    finder = loader._installed_finder()
+    position = sys.meta_path.index(finder)
+    sys.meta_path.insert(0, sys.meta_path.pop(position))
+
+    name = ", ".join(names)
+
+    print(cyan(f"Importing {yellow(name)}..."), flush=True, end="\r")
+
+    started = time.perf_counter()
+    try:
+        modules = [
+            importlib.import_module(import_name) for import_name in names
+        ]
+    except Exception as e:
+        print(red(f"Cannot import {yellow(name)}: {e}"))
+        return -4
+    finally:
+        profiling.remove_hook(profiles.append)
+        sys.meta_path.remove(finder)
+        sys.meta_path.insert(position, finder)
+    elapsed = time.perf_counter() - started
+
+    for module in modules:
+        # Baked loader may be wrapped by the lazy loader
+        module_loader = getattr(module.__spec__, "loader", None)
+        module_loader = getattr(module_loader, "loader", module_loader)
+
+        if not isinstance(module_loader, loader.BakedLoader):
+            print(
+                red(
+                    f"Module {yellow(module.__name__)} was not imported "
+                    f"from {yellow(package_path)}"
+                )
+            )
+            return -5
+
+    print(
+        green(
+            f"Imported {yellow(name)} in {blue(f'{elapsed * 1000:.3f}ms')} "
+            f"({blue(len(profiles))} baked modules)"
+        ),
+        end="\n\n",
+    )
+    print(profiling.format_report(profiles))
+
+    return 0
+
+
 def read():
     args = read_parser.parse_args()
 
-    if args.no_colors or args.module is not None:
+    if args.no_colors or (args.module is not None and not args.profile_import):
         colors.USE_COLORS = False
 
     if args.baked_package.endswith(".py"):
@@ -111,6 +205,9 @@ def read():
         print(red(f"Package {yellow(baked_package)} not found"))
         return -1
 
+    if args.profile_import:
+        return profile_import(package_path, args.module)
+
     from pybaked import BakedReader
 
     if args.module is None:
@@ -118,18 +215,18 @@ def read():
 
     reader = BakedReader(package_path)
     modules = reader.modules_dict
-    packages = reader.packages[1:]
+    packages = [
+        package for package in reader.packages if package not in reader.roots
+    ]
 
     if args.module is not None:
-        module = args.module
-        if not module.startswith(reader.name):
-            module = reader.name + "." + module
+        module = resolve_module(reader, args.module)
 
         if module not in modules:
             print(f"Module {args.module} not found in {baked_package}")
             return -3
 
-        source = reader.read_specific(modules[module])
+        source = reader.read(module)
         print(source.decode())
 
         return 0
@@ -144,15 +241,27 @@ def read():
         print(green(f"Hash matched: {color(reader.hash_match)}"))
 
     print(green(f"Creation date: {blue(str(reader.created))}"))
+
+    if len(reader.roots) > 1:
+        print(green(f"Packages: {yellow(', '.join(reader.roots))}"))
+
     print(green("Metadata:"))
     print(format_metadata(reader.metadata), "\n")
     print(green(f"Subpackages ({blue(len(packages))}):"))
     print(
         "\n".join(
-            "\t- " + yellow(".").join(map(purple, package.split(".")[1:]))
+            "\t- "
+            + yellow(".").join(
+                map(purple, reader.inner_path(package).split("/"))
+            )
             for package in packages
         ),
         end="\n\n",
     )
     print(green(f"Modules ({blue(len(modules))}):"))
-    print(format_modules(list(modules.keys())))
+    print(format_modules(list(modules.keys()), len(reader.roots) == 1))
+
+    if reader.resources:
+        print()
+        print(green(f"Resources ({blue(len(reader.resources))}):"))
+        print("\n".join("\t- " + yellow(path) for path in reader.resources))
@@ -1,5 +1,10 @@
+import functools
+import hashlib
+import os
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 from pybaked import BakedReader, protocol
 from pybaked.cli import colors
@@ -16,11 +21,128 @@ parser.add_argument(
     default=None,
     required=False,
 )
+parser.add_argument(
+    "-j",
+    "--jobs",
+    help="Number of threads writing files",
+    type=int,
+    default=1,
+)
+parser.add_argument(
+    "--sync",
+    help="Skip files matching the package and remove files not in it "
+    "(with the same suffixes as the package files)",
+    action="store_true",
+    default=False,
+)
 parser.add_argument(
     "--no-colors", help="Don't color output", action="store_true", default=False
 )
 
 
+def is_unchanged(
+    file: Path,
+    location: protocol.Location | None,
+    read: Callable[[], bytes | memoryview],
+) -> bool:
+    """
+    Check whether file on disk is the same as the fragment
+
+    :param file: unpacked file path
+    :param location: fragment location
+    :param read: reads (decompressed) fragment body
+    """
+    try:
+        size = file.stat().st_size
+    except FileNotFoundError:
+        return False
+
+    # Digest of the uncompressed body is the digest of the file,
+    # so the body is not read
+    if (
+        location is not None
+        and location.digest is not None
+        and not location.flags & protocol.CODEC_MASK
+    ):
+        if size != location.length:
+            return False
+
+        digest = hashlib.sha256()
+
+        with file.open("rb") as f:
+            while chunk := f.read(protocol.COPY_CHUNK):
+                digest.update(chunk)
+
+        return digest.digest() == location.digest
+
+    body = read()
+
+    return size == len(body) and file.read_bytes() == body
+
+
+def write_file(
+    file: Path,
+    location: protocol.Location | None,
+    read: Callable[[], bytes | memoryview],
+    sync: bool,
+) -> bool:
+    """
+    Write fragment body into the file
+
+    :return: False if file is unchanged and was skipped
+    """
+    # Compressed body is decompressed once to compare and write it
+    read = functools.cache(read)
+
+    if sync and is_unchanged(file, location, read):
+        return False
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_bytes(read())
+
+    return True
+
+
+def remove_stale(output: Path, files: set[Path]) -> list[Path]:
+    """
+    Remove files that are not in the package and directories left empty
+    by their removal (directories that were empty before are kept).
+    Only files with the suffixes of the package files are removed
+    (bytecode cache is kept)
+
+    :return: removed files
+    """
+    removed = []
+    suffixes = {file.suffix for file in files}
+
+    # Directories with removed files or subdirectories
+    emptied = set()
+
+    for dir_path, dir_names, file_names in os.walk(output, topdown=False):
+        dir_path = Path(dir_path)
+
+        if "__pycache__" in dir_path.parts:
+            continue
+
+        for file_name in file_names:
+            file = dir_path / file_name
+
+            if file not in files and file.suffix in suffixes:
+                file.unlink()
+                removed.append(file)
+                emptied.add(dir_path)
+
+        if (
+            dir_path != output
+            and dir_path in emptied
+            and not any(dir_path.iterdir())
+        ):
+            dir_path.rmdir()
+            emptied.add(dir_path.parent)
+
+    return removed
+
+
 def unpack():
     args = parser.parse_args()
 
@@ -66,18 +188,59 @@ def unpack():
     if output is None:
         output = source.name.split(".", 1)[0]
 
+    # Sync removes files that are not in the package from the output
+    if args.sync and source.absolute().is_relative_to(Path(output).absolute()):
+        print(
+            colors.red(
+                f"Cannot sync into {colors.yellow(output)}: "
+                f"it contains the package {display_name}"
+            )
+        )
+        exit(3)
+
     print(
         colors.cyan(f"Unpacking {display_name} into {colors.yellow(output)}...")
     )
-    for name, offset in package.modules_dict.items():
-        name = name.split(".")[1:]
-        module = Path(output, *name).with_suffix(".py")
 
-        module.parent.mkdir(parents=True, exist_ok=True)
+    # File path, kind, fragment location and reader of the body
+    files = []
+
+    for module_name in package.modules_dict:
+        files.append(
+            (
+                Path(output, package.inner_path(module_name) + ".py"),
+                "module",
+                package.locate(module_name),
+                lambda module_name=module_name: package.read(module_name),
+            )
+        )
+
+    for path in package.resources:
+        files.append(
+            (
+                Path(output, *path.split("/")),
+                "resource",
+                package.locate_resource(path),
+                lambda path=path: package.read_resource(path),
+            )
+        )
+
+    # Reader is safe to share: its reads do not use the file position
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        written = executor.map(
+            lambda file: write_file(file[0], file[2], file[3], args.sync),
+            files,
+        )
 
-        module.write_bytes(package.read_specific(offset))
+        for (file, kind, *_), created in zip(files, written):
+            if created:
+                print(colors.cyan(f"Created {colors.yellow(file)} {kind}"))
+            else:
+                print(colors.cyan(f"Unchanged {colors.yellow(file)} {kind}"))
 
-        print(colors.cyan(f"Created {colors.yellow(module)} module"))
+    if args.sync:
+        for file in remove_stale(Path(output), {file for file, *_ in files}):
+            print(colors.cyan(f"Removed stale {colors.yellow(file)}"))
 
     print(
         colors.green(
@@ -1,61 +1,295 @@
+import _imp
+import itertools
 import logging
 import importlib.util
+import marshal
+import os
 import sys
+import threading
+import time
 import types
-from functools import lru_cache
 from importlib.abc import MetaPathFinder, Loader
 from pathlib import Path
+from typing import Iterable
 
-from pybaked import BakedReader, protocol
+from pybaked import BakedReader, profiling, protocol, siteindex, tracing
+from pybaked.bakedreader import MODULE, PACKAGE, ReaderRegistry
+from pybaked.profiling import ModuleProfile
+from pybaked.resources import BakedResources
 
 module_logger = logging.getLogger(__name__)
 
 
-def execute_module(source: str | bytes, module: types.ModuleType):
+def execute_code(
+    code: types.CodeType,
+    module: types.ModuleType,
+    profile: ModuleProfile | None = None,
+):
+    if profile is None:
+        exec(code, module.__dict__)
+        return
+
+    started = time.perf_counter()
+    try:
+        exec(code, module.__dict__)
+    finally:
+        profile.execute += time.perf_counter() - started
+
+
+def execute_module(
+    source: str | bytes | memoryview,
+    module: types.ModuleType,
+    profile: ModuleProfile | None = None,
+):
+    if profile is not None:
+        started = time.perf_counter()
+
     code = compile(source, module.__file__, "exec")
-    exec(code, module.__dict__)
+
+    if profile is not None:
+        profile.compile += time.perf_counter() - started
+
+    execute_code(code, module, profile)
+
+
+def execute_bytecode(
+    bytecode: bytes | memoryview,
+    module: types.ModuleType,
+    profile: ModuleProfile | None = None,
+):
+    if profile is not None:
+        started = time.perf_counter()
+
+    code = marshal.loads(bytecode)
+    # Bytecode was compiled with the location inside the package,
+    # replace it with the real module location
+    _imp._fix_co_filename(code, module.__file__)
+
+    if profile is not None:
+        profile.compile += time.perf_counter() - started
+
+    execute_code(code, module, profile)
 
 
 class BakedPathFinder(MetaPathFinder):
     logger = module_logger.getChild("BakedPathFinder")
 
-    @lru_cache(10)
+    def __init__(
+        self,
+        eager_verify: bool = False,
+        max_open_files: int = 64,
+        lazy: bool = False,
+        prefetch: Iterable[str] | str | Path | None = None,
+    ):
+        """
+        :param eager_verify: Verify whole content of hashed baked package
+            when it is opened. Otherwise only the index is verified when
+            package is opened, and each module is verified when it is executed
+        :param max_open_files: Maximal number of baked files kept open
+        :param lazy: Execute baked modules on the first attribute access
+            instead of import (baked files with "--lazy" metadata flag
+            are always loaded lazily)
+        :param prefetch: Names of the modules (or path to the import trace,
+            see pybaked.tracing) read into memory by the background thread
+            when the baked file holding them is opened
+        """
+        # Readers of the baked files (reopened when file changes)
+        self.readers = ReaderRegistry(max_open_files)
+
+        # Directory => its modification time and top-level package names
+        # of baked files inside it
+        self._listings: dict[str, tuple[int, dict[str, Path]]] = {}
+
+        self.eager_verify = eager_verify
+        self.lazy = lazy
+        self.prefetch: list[str] = []
+
+        self.configure(prefetch=prefetch)
+
+    def configure(
+        self,
+        eager_verify: bool | None = None,
+        max_open_files: int | None = None,
+        lazy: bool | None = None,
+        prefetch: Iterable[str] | str | Path | None = None,
+    ):
+        """
+        Change options of the finder (see __init__), options that are None
+        are kept. Open readers are kept: modules of the already opened baked
+        files are prefetched at once, readers above the new limit are closed
+        when next file is opened
+        """
+        if max_open_files is not None:
+            if max_open_files < 1:
+                raise ValueError("Number of open readers must be positive")
+
+            self.readers.max_open = max_open_files
+
+        if eager_verify is not None:
+            self.eager_verify = eager_verify
+
+        if lazy is not None:
+            self.lazy = lazy
+
+        if prefetch is None:
+            return
+
+        if isinstance(prefetch, (str, Path)):
+            prefetch = tracing.read(prefetch)
+
+        self.prefetch = list(prefetch)
+        self.readers.on_open = self._prefetch if self.prefetch else None
+
+        if self.prefetch:
+            for reader in self.readers.open_readers():
+                self._prefetch(reader)
+
     def reader_for(self, path: Path) -> BakedReader:
-        return BakedReader(path)
+        return self.readers.get(path)
 
-    def find_spec(self, fullname, path, target=...):
-        # Define path entries in which finder will search baked packages
-        entries = sys.path
-        # Extend entries with package path
-        if path is not None:
-            entries.extend(path)
+    def _prefetch(self, reader: BakedReader) -> threading.Thread | None:
+        """
+        Start background thread reading the prefetched modules of the baked
+        file into memory, while modules imported earlier are executed
+        """
+        roots = set(reader.roots)
 
-        for path_entry in entries:
-            self.logger.debug(
-                f"Lookup {path_entry} for baked package in {fullname}"
+        # Baked package may be imported as a subpackage of a normal package
+        module_names = []
+        for name in self.prefetch:
+            parts = name.split(".")
+
+            for i, part in enumerate(parts):
+                if part in roots:
+                    module_names.append(".".join(parts[i:]))
+                    break
+
+        if not module_names:
+            return None
+
+        def prefetch():
+            try:
+                size = reader.prefetch(module_names)
+            except (OSError, ValueError) as e:
+                # Reader may be closed by the registry meanwhile
+                self.logger.debug("Cannot prefetch %s: %s", reader.path, e)
+                return
+
+            self.logger.debug("Prefetched %s bytes of %s", size, reader.path)
+
+        thread = threading.Thread(
+            target=prefetch, name=f"pybaked-prefetch-{reader.name}", daemon=True
+        )
+        thread.start()
+
+        return thread
+
+    def baked_names(self, directory: str) -> dict[str, Path]:
+        """
+        Top-level packages of the baked files inside the directory.
+        Directory is listed again only when its modification time changes
+        (as by FileFinder), or caches are invalidated
+
+        :param directory: directory path
+        :return: mapping {package_name: baked_file_path}
+        """
+        try:
+            mtime = os.stat(directory or ".").st_mtime_ns
+        except OSError:
+            mtime = -1
+
+        listing = self._listings.get(directory)
+
+        if listing is not None and listing[0] == mtime:
+            return listing[1]
+
+        # Site index written by baked-index saves opening every baked file
+        names = siteindex.load(directory)
+
+        if names is not None:
+            self.logger.debug("Using site index of %s", directory)
+            self._listings[directory] = mtime, names
+
+            return names
+
+        names = {}
+
+        try:
+            files = sorted(
+                name
+                for name in os.listdir(directory or ".")
+                if name.endswith(protocol.EXTENSION)
             )
+        except OSError:
+            files = []
+
+        for name in files:
+            baked_file = Path(directory, name)
+
+            # Multi-package archive holds several top-level packages,
+            # their names are stored inside the file. Only the header
+            # is read: file is neither mapped nor kept open
+            try:
+                with BakedReader(baked_file) as reader:
+                    roots = reader.roots
+            except (OSError, ValueError) as e:
+                self.logger.debug(
+                    "Cannot read baked file %s - skipping: %s", baked_file, e
+                )
+                continue
+
+            for root in roots:
+                names.setdefault(root, baked_file)
+
+        self._listings[directory] = mtime, names
+
+        return names
+
+    def invalidate_caches(self):
+        # Readers are not closed: registry reopens changed files itself
+        self._listings.clear()
+
+    def find_spec(self, fullname, path, target=...):
+        if profiling.active():
+            started = time.perf_counter()
+            spec = self._find_spec(fullname, path)
+
+            if spec is not None:
+                # Baked loader may be wrapped by the lazy loader
+                baked_loader = getattr(spec.loader, "loader", spec.loader)
+                baked_loader.find_time = time.perf_counter() - started
+
+            return spec
+
+        return self._find_spec(fullname, path)
+
+    def _find_spec(self, fullname, path):
+        parts = fullname.split(".")
 
-            # Using more convenient interface for working with path
-            baked_package = Path(path_entry)
+        # Path entries in which finder will search baked packages:
+        # sys.path extended with package path
+        for path_entry in itertools.chain(sys.path, path or ()):
+            directory = os.fspath(path_entry)
 
             # Find baked package inside path entry following
             # the module name parts
-            parts = fullname.split(".")
             for i, part in enumerate(parts):
-                baked_package /= part
-
                 # If this is baked package - use it and break loop
-                with_suffix = baked_package.with_suffix(protocol.EXTENSION)
-                if with_suffix.exists():
-                    baked_package = with_suffix
+                baked_package = self.baked_names(directory).get(part)
 
+                if baked_package is not None:
                     # Define inner module name relative to
                     inner_module_name = ".".join(parts[i:])
 
                     self.logger.debug(
-                        f"Found baked package at {baked_package} for {fullname}(inner name: {inner_module_name})"
+                        "Found baked package at %s for %s(inner name: %s)",
+                        baked_package,
+                        fullname,
+                        inner_module_name,
                     )
                     break
+
+                directory = os.path.join(directory, part)
             else:
                 # If package was not found - skip this path entry
                 continue
@@ -63,45 +297,70 @@ class BakedPathFinder(MetaPathFinder):
             # Defining baked package reader to search module inside
             reader = self.reader_for(baked_package)
 
+            if self.eager_verify:
+                hash_match = reader.hash_match
+            else:
+                hash_match = reader.index_hash_match
+
             # If content hash is not matched to metadata hash - skip this baked package
-            if reader.hash_match is False:
+            if hash_match is False:
                 self.logger.debug(
-                    f"Corrupted baked package at {baked_package} - skipping"
+                    "Corrupted baked package at %s - skipping", baked_package
                 )
                 continue
 
             # Define module location
-            location = str(
-                baked_package.joinpath(*inner_module_name.split(".")[1:])
-            )
+            location = str(baked_package / reader.inner_path(inner_module_name))
 
             self.logger.debug(
-                f"Lookup {baked_package} for module {inner_module_name}"
+                "Lookup %s for module %s", baked_package, inner_module_name
             )
 
-            # If it is a normal module - add .py suffix (just in case)
-            if inner_module_name in reader.modules_dict:
-                location += ".py"
+            lookup = reader.lookup(inner_module_name)
+
+            # Packages search submodules (and resources) in the baked package
+            submodule_search_locations = None
 
             # If module not found, and it is not a package
             # inside with this name - skip this baked package
-            elif inner_module_name not in reader.packages:
-
+            if lookup is None:
                 self.logger.debug(
-                    f"Module {inner_module_name} not found in {baked_package} -"
-                    f" abort searching for another packages"
+                    "Module %s not found in %s - "
+                    "abort searching for another packages",
+                    inner_module_name,
+                    baked_package,
                 )
                 return None
 
+            # If it is a normal module - add .py suffix (just in case)
+            if lookup.kind == MODULE:
+                location += ".py"
+            else:
+                submodule_search_locations = [str(baked_package)]
+
             self.logger.debug(
-                f"Module {inner_module_name} found in {baked_package} - proceed loading"
+                "Module %s found in %s - proceed loading",
+                inner_module_name,
+                baked_package,
             )
 
+            loader = BakedLoader(
+                reader,
+                inner_module_name,
+                verify=hash_match is not None and not reader.verified,
+                registry=self.readers,
+            )
+
+            # Module body is read and executed on the first attribute access
+            if self.lazy or reader.metadata.get("--lazy", False):
+                loader = importlib.util.LazyLoader(loader)
+
             # Build spec for module
             return importlib.util.spec_from_file_location(
                 fullname,
                 location,
-                loader=BakedLoader(reader, inner_module_name),
+                loader=loader,
+                submodule_search_locations=submodule_search_locations,
             )
         return None
 
@@ -109,79 +368,321 @@ class BakedPathFinder(MetaPathFinder):
 class BakedLoader(Loader):
     logger = module_logger.getChild("BakedLoader")
 
-    def __init__(self, reader: BakedReader, inner_module_name: str):
-        self.reader = reader
+    def __init__(
+        self,
+        reader: BakedReader,
+        inner_module_name: str,
+        verify: bool = False,
+        registry: ReaderRegistry | None = None,
+    ):
+        """
+        :param reader: Reader of the baked package
+        :param inner_module_name: Module name inside the baked package
+        :param verify: Verify module against its digest before executing
+        :param registry: Registry to reopen the reader from when it is closed
+        """
+        self._reader = reader
         self.inner_module_name = inner_module_name
+        self.verify = verify
+        self.registry = registry
+
+        # Time spent by finder to find the module (recorded when profiling)
+        self.find_time = 0.0
+
+    @property
+    def reader(self) -> BakedReader:
+        # Registry closes least recently used readers, reader of the
+        # module may be closed after the module was found
+        if self.registry is not None:
+            self._reader = self.registry.reopen(self._reader)
+
+        return self._reader
+
+    def get_resource_reader(self, fullname) -> BakedResources | None:
+        # Resources are available only for packages
+        if not self.reader.is_package(self.inner_module_name):
+            return None
+
+        return BakedResources(
+            self.reader,
+            self.reader.inner_path(self.inner_module_name),
+            self.verify,
+            self.registry,
+        )
 
     def create_module(self, spec):
         return types.ModuleType(spec.name)
 
     def exec_module(self, module):
+        if tracing.active():
+            tracing.record(module.__name__)
+
+        if not profiling.active():
+            self._exec_module(module)
+            return
+
+        profile = ModuleProfile(module.__name__, str(self.reader.path))
+        profile.find = self.find_time
+
+        profiling.enter(profile)
+        try:
+            self._exec_module(module, profile)
+        finally:
+            profiling.leave(profile)
+
+    def _exec_module(self, module, profile: ModuleProfile | None = None):
         self.logger.debug(
-            f"Loading module {module.__name__} from {self.reader.path}"
+            "Loading module %s from %s", module.__name__, self.reader.path
         )
         # Define what module will be read from reader.
         # If module is the package then it may be
         # package_name + .__init__ if exists module with that name
         module_name = self.inner_module_name
+        lookup = self.reader.lookup(module_name)
 
         # If module is the package - package must be equal to module name
-        if module_name in self.reader.packages:
+        if lookup is not None and lookup.kind == PACKAGE:
             module.__package__ = module.__name__
 
             # If package has __init__ module - load it
-            if module_name + ".__init__" in self.reader.modules_dict:
-                module_name += ".__init__"
+            if lookup.offset is not None:
+                module_name = lookup.module_name
         else:
             module.__package__ = module.__name__.rsplit(".", 1)[0]
 
-        # Location module inside the baked package
-        # (first element is the name of the package)
-        module_location_inside = module_name.split(".")[1:]
-
         # Define path of the module file
         module.__file__ = (
-            str(self.reader.path / Path(*module_location_inside)) + ".py"
+            str(self.reader.path / self.reader.inner_path(module_name)) + ".py"
         )
 
         # Define package module resolution path
         module.__path__ = [self.reader.path]
 
-        # If module not found in the package - leaving from loader
-        if module_name not in self.reader.modules_dict:
-            self.logger.debug(
-                f"Module {module_name}({module.__name__}) not found in {self.reader.path}"
+        try:
+            # Bytecode of the module compiled for this interpreter
+            bytecode = self.reader.read_bytecode(
+                module_name, self.verify, profile
             )
-            return
 
-        # Offset of the module source in the baked package file
-        source_offset = self.reader.modules_dict[module_name]
+            if bytecode is None:
+                # Source of the module
+                source = self.reader.read(module_name, self.verify, profile)
+        except ValueError as e:
+            raise ImportError(
+                f"Cannot load module {module.__name__}: {e}",
+                name=module.__name__,
+            ) from e
 
-        # Source of the module
-        source = self.reader.read_specific(source_offset)
+        if bytecode is not None:
+            self.logger.debug(
+                "Executing bytecode of module %s(%s)",
+                module_name,
+                module.__name__,
+            )
+
+            # Execute precompiled module code
+            execute_bytecode(bytecode, module, profile)
+        else:
+            # If module not found in the package - leaving from loader
+            if source is None:
+                self.logger.debug(
+                    "Module %s(%s) not found in %s",
+                    module_name,
+                    module.__name__,
+                    self.reader.path,
+                )
+                return
 
-        self.logger.debug(f"Executing module {module_name}({module.__name__})")
+            self.logger.debug(
+                "Executing module %s(%s)", module_name, module.__name__
+            )
 
-        # Compile and execute module code
-        execute_module(source, module)
+            # Compile and execute module code
+            execute_module(source, module, profile)
 
         self.logger.debug(
-            f"Module {module_name}({module.__name__}) successfully executed"
+            "Module %s(%s) successfully executed", module_name, module.__name__
         )
 
         # Install metadata read by reader to all root modules of the baked package
         # Use it to recognize baked modules in code
+        # (read-only mapping shared by all modules of the package)
         if module_name.split(".", 1)[0] == module_name.rsplit(".", 1)[0]:
             self.logger.debug(
-                f"Installing metadata for module {module_name}({module.__name__})"
+                "Installing metadata for module %s(%s)",
+                module_name,
+                module.__name__,
             )
             module.__baked_metadata__ = self.reader.metadata
 
 
-def init():
-    # If already initiated - do nothing
+def _installed_finder() -> BakedPathFinder | None:
     for finder in sys.meta_path:
         if isinstance(finder, BakedPathFinder):
-            return
+            return finder
+
+    return None
+
+
+def init(
+    eager_verify: bool | None = None,
+    max_open_files: int | None = None,
+    lazy: bool | None = None,
+    prefetch: Iterable[str] | str | Path | None = None,
+):
+    """
+    Install finder of the baked packages.
+    If finder is already installed, options passed are applied to it
+    (options that are not passed are kept)
+
+    :param eager_verify: Verify whole content of hashed baked packages
+        when they are opened instead of verifying each module when it is
+        executed (False by default)
+    :param max_open_files: Maximal number of baked files kept open
+        (least recently used files are closed, 64 by default)
+    :param lazy: Execute baked modules on the first attribute access
+        instead of import (False by default)
+    :param prefetch: Names of the modules (or path to the import trace,
+        see pybaked.tracing) read into memory in background when the baked
+        file holding them is opened (empty names disable prefetching)
+    """
+    finder = _installed_finder()
+
+    if finder is None:
+        finder = BakedPathFinder()
+        sys.meta_path.append(finder)
+
+    finder.configure(eager_verify, max_open_files, lazy, prefetch)
+
+
+def _import_prefix(path: Path) -> str | None:
+    """
+    Import name prefix of the packages inside the baked file:
+    names of the packages containing the file relative to sys.path
+
+    :return: prefix or None if file is not located inside sys.path
+    """
+    directory = path.parent
+    prefixes = []
+
+    for path_entry in sys.path:
+        entry = Path(os.path.abspath(os.fspath(path_entry)))
+
+        if directory.is_relative_to(entry):
+            prefixes.append(directory.relative_to(entry).parts)
+
+    if not prefixes:
+        return None
+
+    # The closest entry gives the shortest import name
+    return "".join(part + "." for part in min(prefixes, key=len))
+
+
+def _import_tree(reader: BakedReader, prefix: str, package: str | None):
+    """
+    Import modules of the baked file (or only of the package inside it)
+    """
+    for module_name in reader.modules_dict:
+        if package is not None and not (
+            module_name == package or module_name.startswith(package + ".")
+        ):
+            continue
+
+        # Packages are executed from their __init__ module
+        module_name = module_name.removesuffix(".__init__")
+
+        # Entry points are not imported, they run the application
+        if module_name.rsplit(".", 1)[-1] == "__main__":
+            continue
+
+        try:
+            module = importlib.import_module(prefix + module_name)
+        except ImportError as e:
+            # Module may depend on missing optional packages
+            module_logger.warning(
+                "Cannot preload module %s%s: %s", prefix, module_name, e
+            )
+            continue
+
+        # Lazily loaded module is executed on the first attribute access
+        getattr(module, "__name__")
+
+
+def preload(
+    archives_or_packages: Iterable[str | Path],
+    import_modules: bool = True,
+    **options,
+) -> list[BakedReader]:
+    """
+    Prepare baked packages for import before the process forks
+    (e.g. in the master process of the pre-fork server): open readers of
+    the finder, read their indexes and metadata, verify hashes and import
+    modules, so workers inherit all of it copy-on-write instead of
+    preparing it in every worker. Installs the finder if it is not installed
+
+    :param archives_or_packages: paths to baked files (Path objects or
+        strings ending with the baked extension) or import names
+        of the baked packages
+    :param import_modules: Import all modules of the packages
+        (all modules of the file for paths). Otherwise whole content
+        of the hashed files is verified, so modules are not verified
+        when they are imported by workers
+    :param options: Options of the finder passed to init
+    :return: readers of the preloaded baked files
+    """
+    init(**options)
+    finder = _installed_finder()
+
+    # Directories of sys.path are listed by the first import in any case
+    for path_entry in sys.path:
+        finder.baked_names(os.fspath(path_entry))
+
+    readers = []
+
+    for item in archives_or_packages:
+        if isinstance(item, Path) or item.endswith(protocol.EXTENSION):
+            reader = finder.reader_for(Path(item))
+            package = None
+            prefix = _import_prefix(reader.path)
+
+            if prefix is None and import_modules:
+                raise ValueError(
+                    f"Cannot import modules of {reader.path}: "
+                    f"file is not located inside sys.path"
+                )
+        else:
+            spec = importlib.util.find_spec(item)
+            loader = None if spec is None else spec.loader
+
+            # Baked loader may be wrapped by the lazy loader
+            loader = getattr(loader, "loader", loader)
+
+            if not isinstance(loader, BakedLoader):
+                raise ValueError(f"Baked package {item} not found")
+
+            reader = loader.reader
+            package = loader.inner_module_name
+            prefix = item[: -len(package)]
+
+        # Imported modules are verified when they are executed
+        if finder.eager_verify or not import_modules:
+            hash_match = reader.hash_match
+        else:
+            hash_match = reader.index_hash_match
+
+        if hash_match is False:
+            raise ValueError(
+                f"Baked file {reader.path} does not match its hash"
+            )
+
+        # Index is read once, metadata values are decoded when accessed
+        reader.index
+        for key in reader.metadata:
+            reader.metadata[key]
+
+        if import_modules:
+            _import_tree(reader, prefix, package)
+
+        readers.append(reader)
 
-    sys.meta_path.append(BakedPathFinder())
+    return readers
@@ -0,0 +1,164 @@
+"""
+Import-time profiling of baked modules.
+
+Register a hook with ``add_hook`` to receive ``ModuleProfile`` of every
+baked module executed by the loader, or set ``PYBAKED_PROFILE`` environment
+variable to print the report at exit (``1`` - into stderr, otherwise
+value is the path of the report file)
+"""
+
+import atexit
+import os
+import sys
+import threading
+from typing import Callable, Iterable
+
+ENV_VARIABLE = "PYBAKED_PROFILE"
+
+PHASES = ("find", "read", "verify", "decompress", "compile", "execute")
+
+
+class ModuleProfile:
+    """
+    Time (in seconds) spent on each phase of the module import.
+    ``compile`` is time of unmarshalling for modules with bytecode,
+    ``execute`` includes execution of nested baked modules
+    (``self_time`` excludes it)
+    """
+
+    __slots__ = (
+        "name",
+        "path",
+        "bytes_read",
+        "nested",
+        *PHASES,
+    )
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.bytes_read = 0
+
+        # Total time of the nested baked modules
+        self.nested = 0.0
+
+        for phase in PHASES:
+            setattr(self, phase, 0.0)
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, phase) for phase in PHASES)
+
+    @property
+    def self_time(self) -> float:
+        return self.total - self.nested
+
+    def __repr__(self):
+        return (
+            f"<ModuleProfile {self.name} total={self.total:.6f}s "
+            f"bytes_read={self.bytes_read}>"
+        )
+
+
+_hooks: list[Callable[[ModuleProfile], None]] = []
+_local = threading.local()
+
+
+def add_hook(hook: Callable[[ModuleProfile], None]):
+    """
+    Register hook called with the profile of every executed baked module
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[ModuleProfile], None]):
+    _hooks.remove(hook)
+
+
+def active() -> bool:
+    return bool(_hooks)
+
+
+def enter(profile: ModuleProfile):
+    """
+    Mark start of the module execution
+    """
+    stack = getattr(_local, "stack", None)
+
+    if stack is None:
+        stack = _local.stack = []
+
+    stack.append(profile)
+
+
+def leave(profile: ModuleProfile):
+    """
+    Mark end of the module execution and pass its profile to the hooks
+    """
+    stack = _local.stack
+    stack.remove(profile)
+
+    if stack:
+        stack[-1].nested += profile.total
+
+    for hook in list(_hooks):
+        hook(profile)
+
+
+def format_report(
+    profiles: Iterable[ModuleProfile], sort: str = "self_time"
+) -> str:
+    """
+    Format profiles as a table sorted by the column (descending)
+
+    :param profiles: module profiles
+    :param sort: profile attribute to sort by
+    :return: report table
+    """
+    columns = (*PHASES, "self_time", "total")
+
+    header = (
+        f"{'module':<40} "
+        + " ".join(f"{column:>10}" for column in columns)
+        + f" {'bytes':>10}"
+    )
+    lines = [header, "-" * len(header)]
+
+    for profile in sorted(
+        profiles, key=lambda p: getattr(p, sort), reverse=True
+    ):
+        lines.append(
+            f"{profile.name:<40} "
+            + " ".join(
+                f"{getattr(profile, column) * 1000:>8.3f}ms"
+                for column in columns
+            )
+            + f" {profile.bytes_read:>10}"
+        )
+
+    return "\n".join(lines)
+
+
+def _install_from_environment():
+    destination = os.environ.get(ENV_VARIABLE)
+
+    if not destination:
+        return
+
+    profiles: list[ModuleProfile] = []
+
+    def dump():
+        report = format_report(profiles)
+
+        if destination == "1":
+            print(report, file=sys.stderr)
+            return
+
+        with open(destination, "w") as f:
+            f.write(report + "\n")
+
+    add_hook(profiles.append)
+    atexit.register(dump)
+
+
+_install_from_environment()
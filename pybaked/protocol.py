@@ -1,9 +1,59 @@
 import hashlib
+import importlib.util
+import io
+import mmap
+import os
+import shutil
+import struct
+import threading
+from collections.abc import ItemsView, Mapping
 from datetime import datetime
-from typing import Any, Callable, TypeVar
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, TypeVar
 
 EXTENSION = ".py.baked"
 
+# Files of format version 2 and newer start with the signature
+# followed by the version number. Files without signature are version 1
+SIGNATURE = b"PYBK"
+VERSION = 2
+VERSION_HEADER = struct.Struct("<4sI")
+
+# Site index (written by baked-index) maps top-level packages of all baked
+# files of the directory to the files.
+# SITE_INDEX := VERSION_HEADER(SITE_SIGNATURE) + message of serialized dict
+SITE_INDEX = "baked.index"
+SITE_SIGNATURE = b"PYBI"
+SITE_VERSION = 1
+
+# INDEX := INDEX_HEADER + count * INDEX_ENTRY + NAMES
+# INDEX_HEADER := 8 bytes of count + 8 bytes of names table length
+# INDEX_ENTRY := 8 bytes of name offset + 8 bytes of body offset
+#                + 8 bytes of body length + 8 bytes of flags
+#                + 32 bytes of body digest (SHA-256)
+# Offsets are relative to the index start, entries are sorted by name
+LENGTH = struct.Struct("<Q")
+INDEX_HEADER = struct.Struct("<QQ")
+INDEX_ENTRY = struct.Struct("<QQQQ32s")
+
+# Size of the chunk copied through the user space
+# when kernel copy is not available
+COPY_CHUNK = 1024 * 1024
+
+# Lowest byte of the fragment flags is the codec of the body
+CODEC_MASK = 0xFF
+CODECS = {"zlib": 1, "lzma": 2, "bz2": 3, "zstd": 4}
+_codec_modules = {1: "zlib", 2: "lzma", 3: "bz2", 4: "compression.zstd"}
+
+# Fragment names are module names in import format, so they never contain
+# the NUL byte. Auxiliary fragments (e.g. compiled bytecode) use it to
+# separate the module name from the fragment tag. Resource (data file)
+# fragments are the resource path prefixed by the tag. Sources fragment
+# holds sources tracked by the incremental build (separate from metadata)
+BYTECODE_TAG = b"\x00bytecode\x00"
+RESOURCE_TAG = b"\x00resource\x00"
+SOURCES_FRAGMENT = b"\x00sources"
+MAGIC_NUMBER = importlib.util.MAGIC_NUMBER
+
 
 def pack_type(data: bytes, type_: str) -> bytes:
     return type_.encode() + b"/" + data
@@ -63,69 +113,25 @@ def float_deserialize(b: bytes) -> float:
 
 
 def list_serialize(lst: list) -> bytes:
-    buffer = b""
-
-    for i, element in enumerate(lst):
-        try:
-            buffer += pack_message(serialize(element))
-        except TypeError as e:
-            raise TypeError(f"Unsupported type for {i}") from e
+    buffer = bytearray()
+    _serialize_into(buffer, lst)
 
-    return pack_type(buffer, "list")
+    return bytes(buffer)
 
 
 def list_deserialize(b: bytes) -> list:
-    elements = []
-
-    cursor = 0
-
-    while len(length_bytes := b[cursor : cursor + 8]) > 0:
-        cursor += len(length_bytes)
-        length = int.from_bytes(length_bytes, "little")
-
-        elements.append(deserialize(b[cursor : cursor + length]))
-
-        cursor += length
-
-    return elements
+    return _deserialize_list(bytes(b), 0, len(b))
 
 
 def dict_serialize(d: dict[str, Any]) -> bytes:
-    buffer = b""
+    buffer = bytearray()
+    _serialize_into(buffer, d)
 
-    for key, value in d.items():
-        buffer += pack_message(key.encode())
-
-        try:
-            buffer += pack_message(serialize(value))
-        except TypeError as e:
-            raise TypeError(f"Unsupported value type for {key}") from e
-
-    return pack_type(buffer, "dict")
+    return bytes(buffer)
 
 
 def dict_deserialize(b: bytes) -> dict[str, Any]:
-    dct: dict[str, Any] = {}
-
-    cursor = 0
-
-    while len(length_bytes := b[cursor : cursor + 8]) > 0:
-        cursor += len(length_bytes)
-        length = int.from_bytes(length_bytes, "little")
-
-        element_key = b[cursor : cursor + length]
-
-        cursor += len(element_key)
-
-        length_bytes = b[cursor : cursor + 8]
-        cursor += len(length_bytes)
-        length = int.from_bytes(length_bytes, "little")
-
-        dct[element_key.decode()] = deserialize(b[cursor : cursor + length])
-
-        cursor += length
-
-    return dct
+    return _deserialize_dict(bytes(b), 0, len(b))
 
 
 def datetime_serialize(d: datetime) -> bytes:
@@ -150,32 +156,204 @@ _types = {
 }
 
 
-def deserialize(b: bytes) -> Any:
-    data, type_ = unpack_type(b)
+def _serialize_message_into(buffer: bytearray, data: Any):
+    # Reserve the length and write it when the data is serialized
+    position = len(buffer)
+    buffer += bytes(LENGTH.size)
 
-    if type_ == "bytes":
-        return data
+    _serialize_into(buffer, data)
 
-    if type_ not in _types:
+    LENGTH.pack_into(buffer, position, len(buffer) - position - LENGTH.size)
+
+
+def _serialize_into(buffer: bytearray, data: Any):
+    """
+    Serialize data into the end of the buffer.
+    Nested lists and dicts are written into the same buffer,
+    so serialization is linear in the size of the data
+    """
+    type_ = type(data).__name__
+
+    if type_ == "list":
+        buffer += b"list/"
+
+        for i, element in enumerate(data):
+            try:
+                _serialize_message_into(buffer, element)
+            except TypeError as e:
+                raise TypeError(f"Unsupported type for {i}") from e
+
+    elif type_ == "dict":
+        buffer += b"dict/"
+
+        for key, value in data.items():
+            key_bytes = key.encode()
+            buffer += LENGTH.pack(len(key_bytes))
+            buffer += key_bytes
+
+            try:
+                _serialize_message_into(buffer, value)
+            except TypeError as e:
+                raise TypeError(f"Unsupported value type for {key}") from e
+
+    elif type_ == "bytes":
+        buffer += b"bytes/"
+        buffer += data
+
+    elif type_ in _types:
+        serialize, _ = _types[type_]
+        buffer += serialize(data)
+
+    else:
         raise TypeError(f"Unsupported data type: {type_}")
 
-    _, deserialize = _types[type_]
 
-    return deserialize(data)
+def _messages(data: bytes, start: int, end: int) -> Iterator[tuple[int, int]]:
+    """
+    Iterate over messages of the data range
 
+    :return: start and end offsets of each message content
+    """
+    cursor = start
 
-def serialize(data: Any) -> bytes:
-    type_ = type(data).__name__
+    while cursor < end:
+        (length,) = LENGTH.unpack_from(data, cursor)
+        cursor += LENGTH.size
+
+        yield cursor, cursor + length
+
+        cursor += length
+
+
+def _deserialize_list(data: bytes, start: int, end: int) -> list:
+    return [
+        deserialize_range(data, element_start, element_end)
+        for element_start, element_end in _messages(data, start, end)
+    ]
+
+
+def _deserialize_dict(data: bytes, start: int, end: int) -> dict[str, Any]:
+    messages = _messages(data, start, end)
+
+    # Messages of the dict are pairs of key and value
+    return {
+        data[key_start:key_end].decode(): deserialize_range(
+            data, value_start, value_end
+        )
+        for (key_start, key_end), (value_start, value_end) in zip(
+            messages, messages
+        )
+    }
+
+
+def deserialize_range(data: bytes, start: int, end: int) -> Any:
+    """
+    Deserialize data located in the range of the buffer.
+    Nested lists and dicts are parsed by offsets without copying
+
+    :param data: buffer
+    :param start: data start offset
+    :param end: data end offset
+    :return: deserialized data
+    """
+    separator = data.find(b"/", start, end)
+
+    if separator == -1:
+        raise ValueError("Cannot decode data: type not found")
+
+    type_ = data[start:separator].decode()
+    start = separator + 1
+
+    if type_ == "list":
+        return _deserialize_list(data, start, end)
+
+    if type_ == "dict":
+        return _deserialize_dict(data, start, end)
 
     if type_ == "bytes":
-        return pack_type(data, "bytes")
+        return data[start:end]
 
     if type_ not in _types:
         raise TypeError(f"Unsupported data type: {type_}")
 
-    serialize, _ = _types[type_]
+    _, deserialize = _types[type_]
+
+    return deserialize(data[start:end])
+
+
+def deserialize(b: bytes) -> Any:
+    b = bytes(b)
+
+    return deserialize_range(b, 0, len(b))
+
+
+class LazyDict(Mapping):
+    """
+    Read-only view of the serialized dict.
+    Only offsets of the values are read when view is created,
+    each value is deserialized when it is accessed for the first time
+    """
+
+    __slots__ = ("_data", "_offsets", "_values")
+
+    def __init__(self, data: bytes, start: int, end: int):
+        """
+        :param data: buffer
+        :param start: dict content start offset (after type)
+        :param end: dict content end offset
+        """
+        self._data = data
+
+        # Key => start and end offsets of the serialized value
+        self._offsets: dict[str, tuple[int, int]] = {}
+        # Key => deserialized value
+        self._values: dict[str, Any] = {}
+
+        messages = _messages(data, start, end)
+        for (key_start, key_end), value_range in zip(messages, messages):
+            self._offsets[data[key_start:key_end].decode()] = value_range
 
-    return serialize(data)
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        start, end = self._offsets[key]
+        value = self._values[key] = deserialize_range(self._data, start, end)
+
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+def deserialize_lazy(b: bytes) -> Any:
+    """
+    Same as deserialize, but dict is returned as LazyDict
+    """
+    b = bytes(b)
+
+    if b.startswith(b"dict/"):
+        return LazyDict(b, len(b"dict/"), len(b))
+
+    return deserialize_range(b, 0, len(b))
+
+
+def serialize(data: Any) -> bytes:
+    buffer = bytearray()
+    _serialize_into(buffer, data)
+
+    return bytes(buffer)
 
 
 T = TypeVar("T")
@@ -186,47 +364,469 @@ def register_type(
     serialize: Callable[[T], bytes],
     deserialize: Callable[[bytes], T],
 ):
-    if type_ in _types:
+    if type_.__name__ in _types:
         raise ValueError("Type already registered")
     _types[type_.__name__] = (serialize, deserialize)
 
 
+def bytecode_fragment_name(name: bytes, magic: bytes = None) -> bytes:
+    """
+    Build name of the bytecode fragment for the module.
+    Bytecode fragments are keyed by the interpreter magic number,
+    so one baked file may contain bytecode for several interpreters
+
+    :param name: module name in import format
+    :param magic: interpreter magic number (current interpreter by default)
+    :return: fragment name
+    """
+    if magic is None:
+        magic = MAGIC_NUMBER
+
+    return name + BYTECODE_TAG + magic.hex().encode()
+
+
+def resource_fragment_name(path: str) -> bytes:
+    """
+    Build name of the resource (data file) fragment.
+    Resource fragments share the tag prefix, so they are grouped
+    together in the sorted index
+
+    :param path: resource path relative to the package root ("/"-separated)
+    :return: fragment name
+    """
+    return RESOURCE_TAG + path.encode()
+
+
+def is_module_fragment(name: bytes) -> bool:
+    """
+    Check whether fragment holds module source
+    """
+    return b"\x00" not in name
+
+
+def codec_module(codec: int):
+    """
+    Import module implementing the codec
+
+    :param codec: codec id
+    :return: module with compress and decompress functions
+    """
+    if codec not in _codec_modules:
+        raise ValueError(f"Unsupported codec: {codec}")
+
+    return importlib.import_module(_codec_modules[codec])
+
+
+def compress(data: bytes, codec: int) -> bytes:
+    if not codec:
+        return data
+
+    return codec_module(codec).compress(data)
+
+
+def decompress(data: bytes | memoryview, flags: int) -> bytes | memoryview:
+    """
+    Decompress fragment body using codec from the fragment flags
+
+    :param data: fragment body
+    :param flags: fragment flags
+    :return: decompressed body (or the same object if it is not compressed)
+    """
+    codec = flags & CODEC_MASK
+
+    if not codec:
+        return data
+
+    return codec_module(codec).decompress(data)
+
+
+def fragment_digest(body: bytes | memoryview) -> bytes:
+    return hashlib.sha256(body).digest()
+
+
+def index_hash(digests: Iterable[tuple[bytes, bytes]]) -> bytes:
+    """
+    Makes hash of the fragments from their digests (format version 2).
+    Fragments must be in the index order
+
+    :param digests: fragment names and body digests
+    :return: hash bytes
+    """
+    hash_ = hashlib.sha256()
+
+    for name, digest in digests:
+        hash_.update(name)
+        hash_.update(digest)
+
+    return hash_.digest()
+
+
+class Location(NamedTuple):
+    offset: int
+    length: int | None
+    flags: int
+    digest: bytes | None
+
+
 def pack_message(message: bytes) -> bytes:
     return len(message).to_bytes(8, "little") + message
 
 
-class Fragments:
-    def __init__(self):
-        self._fragments: list[tuple[bytes, bytes]] = []
+def write_message(buffer, message: bytes):
+    """
+    Write message to the buffer without copying it into a packed message
+
+    :param buffer: file-like object with wb mode
+    :param message: message to write
+    """
+    buffer.write(len(message).to_bytes(8, "little"))
+    buffer.write(message)
+
+
+def write_version(buffer, version: int = VERSION, signature: bytes = SIGNATURE):
+    buffer.write(VERSION_HEADER.pack(signature, version))
+
+
+def read_version(buffer) -> int:
+    """
+    Reads format version from the buffer.
+    If buffer has no signature - it is version 1 file,
+    and buffer position is restored
+
+    :param buffer: file-like object with rb mode
+    :return: format version
+    """
+    position = buffer.tell()
+
+    data = buffer.read(VERSION_HEADER.size)
+
+    if len(data) == VERSION_HEADER.size:
+        signature, version = VERSION_HEADER.unpack(data)
+
+        if signature == SIGNATURE:
+            return version
+
+    buffer.seek(position)
+
+    return 1
+
+
+class FragmentsWriter:
+    """
+    Streaming fragments writer. Bodies are written into the spool
+    as they are added, only index entries are kept in memory
+    """
+
+    def __init__(self, spool):
+        """
+        :param spool: file-like object with w+b mode for the bodies
+        """
+        self._spool = spool
+        self._entries: list[tuple[bytes, int, int, int, bytes]] = []
+        self._size = 0
+
+    def add(
+        self,
+        name: bytes,
+        body: bytes,
+        flags: int = 0,
+        digest: bytes | None = None,
+    ):
+        """
+        Add fragment
+
+        :param name: fragment name
+        :param body: fragment body (as it will be written)
+        :param flags: fragment flags (e.g. codec of the body)
+        :param digest: digest of the body (computed if None)
+        """
+        if digest is None:
+            digest = fragment_digest(body)
+
+        self._entries.append((name, self._size, len(body), flags, digest))
+
+        write_message(self._spool, body)
+        self._size += len(body) + 8
+
+    def copy(self, name: bytes, source: int, location: Location):
+        """
+        Copy fragment body from another baked file without reading it into
+        memory. Digest of the body is taken from the index of that file
+
+        :param name: fragment name
+        :param source: file descriptor of the baked file (format version 2)
+        :param location: location of the fragment inside that file
+        """
+        self._entries.append(
+            (name, self._size, location.length, location.flags, location.digest)
+        )
+
+        self._spool.write(LENGTH.pack(location.length))
+        copy_range(
+            source, self._spool, location.offset + LENGTH.size, location.length
+        )
+        self._size += location.length + LENGTH.size
 
     def hash(self) -> bytes:
-        hash_ = hashlib.sha256()
+        return index_hash(
+            (name, digest)
+            for name, *_, digest in sorted(self._entries, key=lambda x: x[0])
+        )
 
-        for name, content in self._fragments:
-            hash_.update(name + content)
+    def write(self, buffer, layout: Iterable[bytes] = ()):
+        """
+        Write fragments index into the buffer and copy bodies from the spool
+
+        :param buffer: file-like object with wb mode
+        :param layout: names of the fragments to place at the front of the
+            bodies in this order, other fragments follow in order they
+            were added
+        """
+        rank = {}
+        for name in layout:
+            rank.setdefault(name, len(rank))
+
+        if not rank:
+            write_index(buffer, self._entries)
+
+            self._spool.seek(0)
+            shutil.copyfileobj(self._spool, buffer)
+            return
+
+        # Sort is stable - fragments outside the layout keep their order
+        entries = sorted(
+            self._entries, key=lambda entry: rank.get(entry[0], len(rank))
+        )
 
-        return hash_.digest()
+        relocated = []
+        offset = 0
+        for name, _, length, flags, digest in entries:
+            relocated.append((name, offset, length, flags, digest))
+            offset += length + LENGTH.size
 
-    def add(self, fragment: tuple[bytes, bytes]):
-        self._fragments.append(fragment)
+        write_index(buffer, relocated)
 
-    def measure_offset(self, offset: int):
-        return sum(
-            map(lambda x: len(x[0]) + 24, self._fragments),
-        ) + sum(map(lambda x: len(x[1]) + 8, self._fragments[:offset]))
+        # Copy bodies from the spool in the new order,
+        # bodies that are adjacent in the spool are copied at once
+        ranges = []
+        for _, offset, length, *_ in entries:
+            size = length + LENGTH.size
 
-    def write(self, buffer):
-        for i, element in enumerate(self._fragments):
-            buffer.write(pack_message(element[0]))
-            buffer.write(
-                pack_message(self.measure_offset(i).to_bytes(8, "little"))
-            )
+            if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+                ranges[-1][1] += size
+            else:
+                ranges.append([offset, size])
+
+        self._spool.flush()
+        try:
+            fileno = self._spool.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+
+        for offset, size in ranges:
+            if fileno is not None:
+                copy_range(fileno, buffer, offset, size)
+                continue
+
+            self._spool.seek(offset)
+            buffer.write(self._spool.read(size))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _kernel_copy(source: int, destination: int, offset: int, length: int):
+    """
+    Copy file range using copy_file_range or sendfile
+
+    :return: number of bytes copied (may be less than length)
+    """
+    copied = 0
+
+    for copy in (
+        getattr(os, "copy_file_range", None),
+        getattr(os, "sendfile", None),
+    ):
+        if copy is None:
+            continue
+
+        try:
+            while copied < length:
+                if copy is os.sendfile:
+                    count = os.sendfile(
+                        destination, source, offset + copied, length - copied
+                    )
+                else:
+                    count = copy(
+                        source, destination, length - copied, offset + copied
+                    )
+
+                if not count:
+                    break
+
+                copied += count
+        except OSError:
+            # Not supported for these files - try next method
+            continue
+
+        if copied == length:
+            break
+
+    return copied
+
+
+def copy_range(source: int, destination, offset: int, length: int):
+    """
+    Copy range of the file into the end of the file-like object.
+    Data is copied by the kernel when destination is a real file
+
+    :param source: source file descriptor
+    :param destination: file-like object with wb mode
+    :param offset: range offset in the source file
+    :param length: range length
+    """
+    try:
+        fileno = destination.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+
+    if fileno is not None:
+        destination.flush()
+        copied = _kernel_copy(source, fileno, offset, length)
+
+        # File position was moved by the kernel
+        destination.seek(0, os.SEEK_END)
+
+        offset += copied
+        length -= copied
+
+    os.lseek(source, offset, os.SEEK_SET)
+
+    while length:
+        chunk = os.read(source, min(length, COPY_CHUNK))
+
+        if not chunk:
+            raise ValueError("Source file ended unexpectedly while copying")
+
+        destination.write(chunk)
+        length -= len(chunk)
+
+
+# Guards position of the file descriptors where os.pread is not available
+_seek_lock = threading.Lock()
+
+
+def pread(source: int, offset: int, length: int) -> bytes:
+    """
+    Read range of the file without moving its position, so several threads
+    may read the same file descriptor at once. Where os.pread is not
+    available (Windows) file position is moved under the lock
+
+    :param source: file descriptor
+    :param offset: range offset
+    :param length: range length
+    :return: bytes read (less than length if file ended)
+    """
+    chunks = []
+
+    if not hasattr(os, "pread"):
+        with _seek_lock:
+            os.lseek(source, offset, os.SEEK_SET)
+
+            while length:
+                chunk = os.read(source, length)
+
+                if not chunk:
+                    break
+
+                chunks.append(chunk)
+                length -= len(chunk)
+
+        return b"".join(chunks)
+
+    while length:
+        chunk = os.pread(source, length, offset)
+
+        if not chunk:
+            break
+
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+
+    return b"".join(chunks)
+
+
+class Cursor:
+    """
+    Read-only file-like view of the file descriptor (or mapping) with its own
+    position. Reads are positional, so cursors of different threads over
+    the same file do not move each other
+    """
+
+    def __init__(self, source: int | mmap.mmap, position: int = 0):
+        """
+        :param source: file descriptor or mapping of the file
+        :param position: initial position
+        """
+        self._source = source
+        self._position = position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            self._position = offset
+        elif whence == os.SEEK_CUR:
+            self._position += offset
+        else:
+            raise ValueError(f"Unsupported whence for cursor: {whence}")
+
+        return self._position
+
+    def read(self, size: int) -> bytes:
+        if isinstance(self._source, mmap.mmap):
+            data = self._source[self._position : self._position + size]
+        else:
+            data = pread(self._source, self._position, size)
+
+        self._position += len(data)
+
+        return data
+
+
+def write_index(buffer, entries: list[tuple[bytes, int, int, int, bytes]]):
+    """
+    Write fragments index into the buffer.
+    Bodies must be written right after the index
+
+    :param buffer: file-like object with wb mode
+    :param entries: fragment name, body offset relative
+        to the bodies start, body length, flags and body digest
+    """
+    order = sorted(range(len(entries)), key=lambda i: entries[i][0])
 
-        for element in self._fragments:
-            buffer.write(pack_message(element[1]))
+    names = b"".join(entries[i][0] for i in order)
 
-    def __iter__(self):
-        return iter(self._fragments)
+    # Body section starts right after the index
+    bodies_offset = (
+        INDEX_HEADER.size + INDEX_ENTRY.size * len(entries) + len(names)
+    )
+
+    buffer.write(INDEX_HEADER.pack(len(entries), len(names)))
+
+    name_offset = 0
+    for i in order:
+        name, offset, length, flags, digest = entries[i]
+        buffer.write(
+            INDEX_ENTRY.pack(
+                name_offset, bodies_offset + offset, length, flags, digest
+            )
+        )
+        name_offset += len(name)
+
+    buffer.write(names)
 
 
 def read_buffer(buffer) -> bytes:
@@ -255,6 +855,25 @@ def read_buffer(buffer) -> bytes:
     return data
 
 
+def view_message(data, offset: int) -> memoryview:
+    """
+    Makes a view of the message located at offset without copying it
+
+    :param data: bytes-like object (e.g. mmap)
+    :param offset: message offset
+    :return: memoryview of the message content
+    """
+    length = int.from_bytes(data[offset : offset + 8], "little")
+    start = offset + 8
+
+    if start + length > len(data):
+        raise ValueError(
+            "Buffer ended unexpectedly while reading the message content"
+        )
+
+    return memoryview(data)[start : start + length]
+
+
 def read_fragments(buffer) -> list[tuple[bytes, int]]:
     """
     Reads all fragments from buffer. Returns a list of tuples (name, offset).
@@ -291,18 +910,216 @@ def read_fragments(buffer) -> list[tuple[bytes, int]]:
     return fragments
 
 
-def hash_fragments(buffer) -> bytes:
+class FragmentIndex(Mapping):
+    """
+    Sorted fixed-width fragment index (format version 2).
+    Maps fragment name to its body offset. Lookup is a binary search
+    over the raw index, so no list of fragments is materialised
     """
-    Reads all fragments and its content from file and makes hash of it.
 
-    :param buffer: file-like object with rb mode
+    def __init__(self, entries: bytes, names: bytes, position: int):
+        self._entries = entries
+        self._names = names
+        self._position = position
+        self._count = len(entries) // INDEX_ENTRY.size
+
+    @classmethod
+    def read(cls, buffer) -> "FragmentIndex":
+        """
+        Reads index from the buffer
+
+        :param buffer: file-like object with rb mode
+        """
+        position = buffer.tell()
+
+        header = buffer.read(INDEX_HEADER.size)
+        if len(header) != INDEX_HEADER.size:
+            raise ValueError(
+                "Buffer ended unexpectedly while reading the index header"
+            )
+
+        count, names_length = INDEX_HEADER.unpack(header)
+
+        entries_length = count * INDEX_ENTRY.size
+        data = buffer.read(entries_length + names_length)
+
+        if len(data) != entries_length + names_length:
+            raise ValueError(
+                "Buffer ended unexpectedly while reading the index"
+            )
+
+        return cls(data[:entries_length], data[entries_length:], position)
+
+    def _name(self, i: int) -> bytes:
+        start = INDEX_ENTRY.unpack_from(self._entries, i * INDEX_ENTRY.size)[0]
+
+        if i + 1 < self._count:
+            end = INDEX_ENTRY.unpack_from(
+                self._entries, (i + 1) * INDEX_ENTRY.size
+            )[0]
+        else:
+            end = len(self._names)
+
+        return self._names[start:end]
+
+    def _bisect(self, name: bytes) -> int:
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self._name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _location(self, i: int) -> Location:
+        _, offset, length, flags, digest = INDEX_ENTRY.unpack_from(
+            self._entries, i * INDEX_ENTRY.size
+        )
+
+        return Location(self._position + offset, length, flags, digest)
+
+    def locate(self, name: bytes) -> Location | None:
+        """
+        Find fragment body
+
+        :param name: fragment name
+        :return: fragment location or None if fragment not found
+        """
+        i = self._bisect(name)
+
+        if i == self._count or self._name(i) != name:
+            return None
+
+        return self._location(i)
+
+    def _scan(self) -> Iterator[tuple[bytes, tuple]]:
+        """
+        Iterate over fragment names and raw entries in one linear pass:
+        end of each name is the start of the next one
+        """
+        entries = INDEX_ENTRY.iter_unpack(self._entries)
+        previous = next(entries, None)
+
+        for entry in entries:
+            yield self._names[previous[0] : entry[0]], previous
+            previous = entry
+
+        if previous is not None:
+            yield self._names[previous[0] :], previous
+
+    def locations(self) -> Iterator[tuple[bytes, Location]]:
+        """
+        Iterate over fragment names and locations in the index order
+        """
+        position = self._position
+
+        for name, (_, offset, length, flags, digest) in self._scan():
+            yield name, Location(position + offset, length, flags, digest)
+
+    def hash(self) -> bytes:
+        """
+        Hash of the fragments made from the digests stored in the index.
+        Matches the real content hash only if all bodies match their digests
+        """
+        return index_hash(
+            (name, location.digest) for name, location in self.locations()
+        )
+
+    def has_prefix(self, prefix: bytes) -> bool:
+        """
+        Check whether any fragment name starts with prefix
+        """
+        i = self._bisect(prefix)
+
+        return i < self._count and self._name(i).startswith(prefix)
+
+    def has_modules(self) -> bool:
+        """
+        Check whether any fragment holds module source. Names of the
+        auxiliary fragments contain zero byte: resource (and sources)
+        names start with it and sort first, bytecode fragments follow
+        their module source
+        """
+        return self._bisect(b"\x01") < self._count
+
+    def __getitem__(self, name: bytes) -> int:
+        location = self.locate(name)
+
+        if location is None:
+            raise KeyError(name)
+
+        return location.offset
+
+    def __contains__(self, name) -> bool:
+        return self.locate(name) is not None
+
+    def __iter__(self) -> Iterator[bytes]:
+        return (name for name, _ in self._scan())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> ItemsView[bytes, int]:
+        return _FragmentItems(self)
+
+
+class _FragmentItems(ItemsView):
     """
+    Items of the fragment index read in one linear pass
+    instead of the binary search per name
+    """
+
+    def __iter__(self) -> Iterator[tuple[bytes, int]]:
+        return (
+            (name, location.offset)
+            for name, location in self._mapping.locations()
+        )
+
+
+def read_body(buffer, offset: int) -> bytes | memoryview:
+    if isinstance(buffer, mmap.mmap):
+        return view_message(buffer, offset)
+
+    buffer.seek(offset)
+    return read_buffer(buffer)
+
+
+def hash_index(buffer, index: FragmentIndex) -> bytes:
+    """
+    Reads all fragments content from file and makes hash of it
+    from the real digests (format version 2)
+
+    :param buffer: file-like object with rb mode or mmap
+        (fragments contents are hashed without copying)
+    :param index: fragments index
+    """
+    return index_hash(
+        (name, fragment_digest(read_body(buffer, location.offset)))
+        for name, location in index.locations()
+    )
+
+
+def hash_fragments(buffer, fragments: Mapping[bytes, int] = None) -> bytes:
+    """
+    Reads all fragments and its content from file and makes hash of it
+    (format version 1).
+
+    :param buffer: file-like object with rb mode or mmap
+        (fragments contents are hashed without copying)
+    :param fragments: fragment offsets by name (read from buffer if None)
+    """
+    if fragments is None:
+        items = read_fragments(buffer)
+    else:
+        items = fragments.items()
+
     hash_ = hashlib.sha256()
-    for name, offset in read_fragments(buffer):
+    for name, offset in items:
         hash_.update(name)
-
-        buffer.seek(offset)
-        content = read_buffer(buffer)
-        hash_.update(content)
+        hash_.update(read_body(buffer, offset))
 
     return hash_.digest()
@@ -1,7 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator, Mapping
+import hashlib
+import itertools
 import logging
+import marshal
+import secrets
+import tempfile
 import os
 import io
 
@@ -34,6 +40,131 @@ def find_modules(package_path: Path):
     return modules
 
 
+def find_resources(package_path: Path):
+    """
+    Find data files of the package: all files except python modules
+    and bytecode cache
+
+    :return: list of resource path relative to the package ("/"-separated)
+        and path to the file
+    """
+    resources: list[tuple[str, str]] = []
+    for dir_path, dir_names, files in os.walk(package_path):
+        dir_names[:] = [name for name in dir_names if name != "__pycache__"]
+
+        dir_path = Path(dir_path)
+        for resource_file in files:
+            if resource_file.endswith((".py", ".pyc")):
+                continue
+
+            resource_path = dir_path / resource_file
+
+            resources.append(
+                (
+                    resource_path.relative_to(package_path).as_posix(),
+                    str(resource_path),
+                )
+            )
+
+    return resources
+
+
+def compile_bytecode(import_name: bytes, source_code: bytes) -> bytes | None:
+    """
+    Compile module source into marshalled code
+
+    :return: marshalled code or None if source cannot be compiled
+    """
+    # Real location of the module is known only at import time,
+    # loader fixes filename of the code object
+    filename = import_name.decode().replace(".", "/") + ".py"
+
+    try:
+        code = compile(source_code, filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        # Leave error to be raised at import time as for source modules
+        logger.warning(
+            f"Cannot compile '{import_name.decode()}', bytecode skipped: {e}"
+        )
+        return None
+
+    return marshal.dumps(code)
+
+
+def prepare_fragment(body: bytes, codec: int = 0) -> tuple[bytes, int, bytes]:
+    """
+    Compress fragment body with the codec and compute digest of the stored
+    body (in the worker process, as compilation and compression)
+
+    :return: fragment body, flags and digest
+    """
+    flags = 0
+
+    if codec:
+        compressed = protocol.compress(body, codec)
+
+        # Keep body as is if compression does not make it smaller
+        if len(compressed) < len(body):
+            body, flags = compressed, codec
+
+    return body, flags, protocol.fragment_digest(body)
+
+
+def prepare_module(
+    import_name: bytes,
+    source_code: bytes,
+    bytecode: bool = False,
+    codec: int = 0,
+) -> list[tuple[bytes, bytes, int, bytes]]:
+    """
+    Make fragments of the module: source and (optionally) bytecode
+
+    :return: list of fragments name, body, flags and digest
+    """
+    fragments = [(import_name, *prepare_fragment(source_code, codec))]
+
+    if bytecode:
+        code = compile_bytecode(import_name, source_code)
+
+        if code is not None:
+            fragments.append(
+                (
+                    protocol.bytecode_fragment_name(import_name),
+                    *prepare_fragment(code, codec),
+                )
+            )
+
+    return fragments
+
+
+def prepare_source(
+    import_name: bytes, source: bytes | Path, bytecode: bool, codec: int
+) -> list[tuple[bytes, bytes, int, bytes]]:
+    """
+    Same as prepare_module, but source may be a path of the module file
+    """
+    if isinstance(source, Path):
+        source = source.read_bytes()
+
+    return prepare_module(import_name, source, bytecode, codec)
+
+
+def prepare_resource(
+    path: str, data: bytes | Path, codec: int
+) -> list[tuple[bytes, bytes, int, bytes]]:
+    """
+    Make fragment of the resource, data may be a path of the resource file
+
+    :return: list of fragment name, body, flags and digest
+    """
+    if isinstance(data, Path):
+        data = data.read_bytes()
+
+    return [
+        (protocol.resource_fragment_name(path), *prepare_fragment(data, codec))
+    ]
+
+
 class BakedMaker:
     logger = logger.getChild("BakedMaker")
 
@@ -43,6 +174,10 @@ class BakedMaker:
         package_path: str | Path,
         hash_content: bool = False,
         metadata: dict[str, Any] = None,
+        bytecode: bool = False,
+        compression: str | None = None,
+        workers: int = 1,
+        resources: bool = False,
     ) -> "BakedMaker":
         """
         Lookup path for python modules and create BakedMaker instance
@@ -50,6 +185,12 @@ class BakedMaker:
         :param package_path: Path to package
         :param hash_content: Whether to hash the content
         :param metadata: Metadata dictionary
+        :param bytecode: Whether to include compiled bytecode of the modules
+        :param compression: Codec to compress modules with (see protocol.CODECS)
+        :param workers: Number of processes reading and preparing modules.
+            Modules order (and output) is the same as with one worker
+        :param resources: Whether to include data files (all files except
+            python modules) of the package
         :return: The created BakedMaker instance
         """
         if isinstance(package_path, str):
@@ -63,20 +204,101 @@ class BakedMaker:
         if not (modules := find_modules(package_path)):
             raise ValueError("No modules found in package")
 
-        instance = cls(hash_content, metadata)
+        instance = cls(hash_content, metadata, bytecode, compression, workers)
 
         for import_name, module_file in modules:
             cls.logger.debug(
                 f"Including '{module_file}' as '{import_name}' from '{package_path}'"
             )
-            instance.include_module(
-                import_name.encode(), Path(module_file).read_bytes()
-            )
+            instance.include_module_file(import_name.encode(), module_file)
+
+        if resources:
+            for resource_path, resource_file in find_resources(package_path):
+                cls.logger.debug(
+                    f"Including '{resource_file}' as resource '{resource_path}'"
+                )
+                instance.include_resource_file(resource_path, resource_file)
+
+        return instance
+
+    @classmethod
+    def from_packages(
+        cls,
+        package_paths: Iterable[str | Path],
+        hash_content: bool = False,
+        metadata: dict[str, Any] = None,
+        bytecode: bool = False,
+        compression: str | None = None,
+        workers: int = 1,
+        resources: bool = False,
+    ) -> "BakedMaker":
+        """
+        Create BakedMaker instance including several packages into one
+        baked file (multi-package archive). Each package is imported
+        by its directory name
+        :param package_paths: Paths to packages
+        :param hash_content: Whether to hash the content
+        :param metadata: Metadata dictionary
+        :param bytecode: Whether to include compiled bytecode of the modules
+        :param compression: Codec to compress modules with (see protocol.CODECS)
+        :param workers: Number of processes reading and preparing modules
+        :param resources: Whether to include data files of the packages
+        :return: The created BakedMaker instance
+        """
+        packages: dict[str, Path] = {}
+
+        for package_path in map(Path, package_paths):
+            package_path = package_path.absolute()
+
+            if not package_path.is_dir():
+                raise ValueError(
+                    f"Package path {package_path} is not a directory"
+                )
+
+            if package_path.name in packages:
+                raise ValueError(f"Duplicate package name: {package_path.name}")
+
+            packages[package_path.name] = package_path
+
+        if not packages:
+            raise ValueError("No packages passed")
+
+        instance = cls(
+            hash_content,
+            metadata,
+            bytecode,
+            compression,
+            workers,
+            roots=list(packages),
+        )
+
+        for package_name, package_path in packages.items():
+            if not (modules := find_modules(package_path)):
+                raise ValueError(f"No modules found in package {package_name}")
+
+            for import_name, module_file in modules:
+                instance.include_module_file(
+                    f"{package_name}.{import_name}".encode(), module_file
+                )
+
+            if resources:
+                for resource_path, resource_file in find_resources(
+                    package_path
+                ):
+                    instance.include_resource_file(
+                        f"{package_name}/{resource_path}", resource_file
+                    )
 
         return instance
 
     def __init__(
-        self, hash_content: bool = False, metadata: dict[str, Any] = None
+        self,
+        hash_content: bool = False,
+        metadata: dict[str, Any] = None,
+        bytecode: bool = False,
+        compression: str | None = None,
+        workers: int = 1,
+        roots: list[str] | None = None,
     ):
         if metadata is None:
             metadata = {}
@@ -84,10 +306,52 @@ class BakedMaker:
         if not isinstance(metadata, dict):
             raise ValueError("Metadata must be a dict")
 
+        if workers < 1:
+            raise ValueError("Number of workers must be positive")
+
+        codec = 0
+        if compression is not None:
+            if compression not in protocol.CODECS:
+                raise ValueError(f"Unsupported compression: {compression}")
+
+            codec = protocol.CODECS[compression]
+
+            try:
+                protocol.codec_module(codec)
+            except ImportError as e:
+                raise ValueError(
+                    f"Compression {compression} is not available"
+                ) from e
+
         self._hash_content = hash_content
         self._metadata = metadata
-
-        self._fragments = protocol.Fragments()
+        self._bytecode = bytecode
+        self._codec = codec
+        self._workers = workers
+
+        # Top-level packages of the multi-package archive: module names
+        # (and resource paths) start with the package name
+        self._roots = roots
+
+        # Previous baked file to reuse fragments of unchanged modules from.
+        # Sources are tracked only for incremental builds:
+        # fragment name => modification time, size, digest and codec
+        self._previous: Path | None = None
+        self._track_sources = False
+        self._sources: dict[str, list] = {}
+
+        # Module name => source code or path to the module file
+        # (read only when package is built)
+        self._modules: dict[bytes, bytes | Path] = {}
+
+        # Resource path => data or path to the resource file
+        self._resources: dict[str, bytes | Path] = {}
+
+        # Import names of the modules to place at the front of the file
+        # (in order of the first use) and name of the package they are
+        # imported from
+        self._layout: list[str] = []
+        self._layout_package: str | None = None
 
     def get_metadata(self) -> dict[str, Any]:
         """
@@ -140,18 +404,346 @@ class BakedMaker:
         :param source_code: Module source code
         :return: The same instance of BakedMaker
         """
-        self._fragments.add(
-            (
-                import_name,
-                source_code,
+        self._modules[import_name] = source_code
+
+        return self
+
+    def include_module_file(
+        self, import_name: bytes, module_file: str | Path
+    ) -> "BakedMaker":
+        """
+        Include module file in BakedMaker.
+        File is read only when the package is built
+
+        :param import_name: Module name if import format (example: baked_package.module_name)
+        :param module_file: Path to the module file
+        :return: The same instance of BakedMaker
+        """
+        self._modules[import_name] = Path(module_file)
+
+        return self
+
+    def include_resource(self, path: str, data: bytes) -> "BakedMaker":
+        """
+        Include resource (data file) in BakedMaker
+
+        :param path: Resource path relative to the package root
+            ("/"-separated, example: templates/index.html)
+        :param data: Resource content
+        :return: The same instance of BakedMaker
+        """
+        self._resources[path] = data
+
+        return self
+
+    def include_resource_file(
+        self, path: str, resource_file: str | Path
+    ) -> "BakedMaker":
+        """
+        Include resource file in BakedMaker.
+        File is read only when the package is built
+
+        :param path: Resource path relative to the package root
+            ("/"-separated, example: templates/index.html)
+        :param resource_file: Path to the resource file
+        :return: The same instance of BakedMaker
+        """
+        self._resources[path] = Path(resource_file)
+
+        return self
+
+    def layout(
+        self, modules: Iterable[str], package: str | None = None
+    ) -> "BakedMaker":
+        """
+        Place fragments of the modules at the front of the baked file
+        in the given order (modules not in the package are skipped),
+        other fragments follow them. Use trace of the imports
+        (see pybaked.tracing), so cold start reads the file sequentially
+
+        :param modules: import names of the modules in order of the first use
+        :param package: name of the baked package the modules are imported
+            from, found in any part of the import name (by default first
+            part of the import name is skipped). Not used for multi-package
+            archives, their top-level package names are searched instead
+        :return: The same instance of BakedMaker
+        """
+        self._layout = list(modules)
+        self._layout_package = package
+
+        return self
+
+    def _layout_name(self, import_name: str) -> str | None:
+        """
+        Module name inside the package of the traced import name.
+        Baked package may be imported as a subpackage of a normal package,
+        so its name is searched in any part of the import name
+
+        :return: module name or None if module is not in the package
+        """
+        parts = import_name.split(".")
+
+        if self._roots is not None:
+            for i, part in enumerate(parts):
+                if part in self._roots:
+                    return ".".join(parts[i:])
+
+            return None
+
+        if self._layout_package is None:
+            return import_name.partition(".")[2]
+
+        for i, part in enumerate(parts):
+            if part == self._layout_package:
+                return ".".join(parts[i + 1 :])
+
+        return None
+
+    def _layout_fragments(self) -> list[bytes]:
+        """
+        Fragment names of the layout modules (bytecode goes first,
+        as loader reads only bytecode if it is present)
+        """
+        fragments = []
+
+        for import_name in self._layout:
+            name = self._layout_name(import_name)
+
+            if name is None:
+                continue
+
+            # Packages are executed from their __init__ module
+            for candidate in (f"{name}.__init__".lstrip("."), name):
+                candidate = candidate.encode()
+
+                if candidate not in self._modules:
+                    continue
+
+                if self._bytecode:
+                    fragments.append(protocol.bytecode_fragment_name(candidate))
+
+                fragments.append(candidate)
+                break
+
+        if self._layout and not fragments:
+            self.logger.warning(
+                "No traced module found in the package - layout is not applied"
             )
-        )
+
+        return fragments
+
+    def incremental(self, previous: str | Path) -> "BakedMaker":
+        """
+        Reuse fragments of the previous build of the package.
+        Modules and resources not changed since then (same modification time
+        and size, or same content) are copied from the previous baked file
+        without reading and preparing them again. Sources are tracked in the
+        built package, so it may be the previous one for the next build
+
+        :param previous: Previous baked file (full build if it does not exist)
+        :return: The same instance of BakedMaker
+        """
+        self._previous = Path(previous)
+        self._track_sources = True
 
         return self
 
-    def _build_content(self) -> io.BytesIO:
+    def _track(
+        self,
+        previous,
+        tracked: Mapping[str, list],
+        fragments: protocol.FragmentsWriter,
+        name: bytes,
+        source: bytes | Path,
+        bytecode: bool,
+    ) -> bytes | None:
+        """
+        Track source of the fragment and copy the fragment (and bytecode)
+        from the previous baked file if source is not changed
+
+        :return: None if fragment was copied, source to prepare otherwise
+        """
+        if isinstance(source, Path):
+            stat = source.stat()
+            mtime, size = stat.st_mtime_ns, stat.st_size
+        else:
+            mtime, size = 0, len(source)
+
+        key = name.decode()
+        entry = tracked.get(key)
+
+        names = [name]
+        if bytecode:
+            names.append(protocol.bytecode_fragment_name(name))
+
+        locations = None
+        if entry is not None and entry[3] == self._codec:
+            locations = [previous.index.locate(name) for name in names]
+
+            if None in locations:
+                locations = None
+
+        if (
+            locations is None
+            or not isinstance(source, Path)
+            or (mtime, size) != (entry[0], entry[1])
+        ):
+            if isinstance(source, Path):
+                source = source.read_bytes()
+
+            digest = hashlib.sha256(source).digest()
+            self._sources[key] = [mtime, size, digest, self._codec]
+
+            if locations is None or digest != entry[2]:
+                return source
+
+        else:
+            self._sources[key] = [mtime, size, entry[2], self._codec]
+
+        for name, location in zip(names, locations):
+            fragments.copy(name, previous.fileno(), location)
+
+        return None
+
+    def _reuse(
+        self, fragments: protocol.FragmentsWriter
+    ) -> tuple[dict[bytes, bytes], dict[str, bytes]]:
+        """
+        Copy fragments of unchanged modules and resources
+        from the previous baked file
+
+        :return: changed modules and resources (with sources read)
+        """
+        from .bakedreader import BakedReader
+
+        self._sources = {}
+
+        previous = None
+        tracked = {}
+
+        if self._previous is not None and self._previous.is_file():
+            previous = BakedReader(self._previous)
+
+            # Format version 1 has no lengths and digests of the fragments
+            if previous.version >= 2:
+                tracked = previous.sources
+            else:
+                self.logger.warning(
+                    f"Cannot reuse {self._previous}: unsupported version"
+                )
+
+        modules = {}
+        resources = {}
+
+        try:
+            for name, source in self._modules.items():
+                source = self._track(
+                    previous, tracked, fragments, name, source, self._bytecode
+                )
+
+                if source is not None:
+                    modules[name] = source
+
+            for path, data in self._resources.items():
+                data = self._track(
+                    previous,
+                    tracked,
+                    fragments,
+                    protocol.resource_fragment_name(path),
+                    data,
+                    False,
+                )
+
+                if data is not None:
+                    resources[path] = data
+        finally:
+            if previous is not None:
+                previous.close()
+
+        self.logger.debug(
+            f"{len(self._modules) - len(modules)} modules and "
+            f"{len(self._resources) - len(resources)} resources reused "
+            f"from {self._previous}"
+        )
+
+        return modules, resources
+
+    def _prepare(
+        self,
+        modules: dict[bytes, bytes | Path],
+        resources: dict[str, bytes | Path],
+    ) -> Iterator[list[tuple[bytes, bytes, int, bytes]]]:
+        """
+        Prepare fragments of the modules sorted by module name,
+        followed by fragments of the resources sorted by path
+        """
+        names = sorted(modules)
+        sources = [modules[name] for name in names]
+
+        paths = sorted(resources)
+        resources = [resources[path] for path in paths]
+
+        if self._workers == 1:
+            for name, source in zip(names, sources):
+                yield prepare_source(name, source, self._bytecode, self._codec)
+
+            for path, data in zip(paths, resources):
+                yield prepare_resource(path, data, self._codec)
+
+            return
+
+        self.logger.debug(
+            f"Preparing {len(names)} modules using {self._workers} workers"
+        )
+
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            # map preserves order of the modules
+            yield from executor.map(
+                prepare_source,
+                names,
+                sources,
+                itertools.repeat(self._bytecode),
+                itertools.repeat(self._codec),
+                chunksize=max(1, len(names) // (self._workers * 4)),
+            )
+            yield from executor.map(
+                prepare_resource,
+                paths,
+                resources,
+                itertools.repeat(self._codec),
+                chunksize=max(1, len(paths) // (self._workers * 4)),
+            )
+
+    def _build(self, buffer, spool):
+        """
+        Build package into the buffer.
+        Fragment bodies are streamed into the spool while modules are
+        prepared, and copied into the buffer after the index
+
+        :param buffer: file-like object with wb mode
+        :param spool: file-like object with w+b mode
+        """
         self.logger.debug("Started building content")
-        buffer = io.BytesIO()
+
+        fragments = protocol.FragmentsWriter(spool)
+
+        modules, resources = self._modules, self._resources
+        if self._track_sources:
+            modules, resources = self._reuse(fragments)
+
+        for prepared in self._prepare(modules, resources):
+            for name, body, flags, digest in prepared:
+                fragments.add(name, body, flags, digest)
+
+        # Sources are kept out of the metadata shared by all modules
+        if self._track_sources:
+            fragments.add(
+                protocol.SOURCES_FRAGMENT, protocol.serialize(self._sources)
+            )
+
+        self.logger.debug(f"{len(fragments)} fragments was prepared")
+
+        protocol.write_version(buffer)
         creation_date = datetime.utcnow()
         write_content(
             buffer,
@@ -164,37 +756,42 @@ class BakedMaker:
             extra={"creation_date": creation_date},
         )
         if self._hash_content:
-            fragments_hash = self._fragments.hash()
+            fragments_hash = fragments.hash()
             self._metadata.update({"--fh": fragments_hash})
             self.logger.debug(
                 "Fragments was hashed",
                 extra={"hash": int.from_bytes(fragments_hash, "big")},
             )
 
+        if self._roots is not None:
+            self._metadata.update({"--roots": self._roots})
+
         write_content(buffer, protocol.serialize(self._metadata))
         self.logger.debug(
             "Metadata was written to a buffer",
         )
 
-        self._fragments.write(buffer)
+        fragments.write(buffer, self._layout_fragments())
         self.logger.debug("Fragments was written to a buffer")
 
         self.logger.debug("Building content finished")
 
-        buffer.seek(0)
-        return buffer
-
     def bytes(self):
         """
         Make baked package in bytes from stored content
 
         :return: package bytes
         """
-        return self._build_content().read()
+        buffer = io.BytesIO()
+        self._build(buffer, io.BytesIO())
+
+        return buffer.getvalue()
 
     def file(self, filename: str | Path) -> Path:
         """
-        Make baked package file from stored content
+        Make baked package file from stored content.
+        Package is written into a temporary file that replaces
+        the target at the end, so readers never see a half-written file
 
         :param filename: output file name
         :return: path to file created
@@ -207,7 +804,20 @@ class BakedMaker:
                 filename.name.split(".", 1)[0] + protocol.EXTENSION
             )
 
-        with filename.open("wb") as f:
-            f.write(self.bytes())
+        temp_filename = filename.with_name(
+            f".{filename.name}.{secrets.token_hex(4)}.tmp"
+        )
+
+        try:
+            with (
+                tempfile.TemporaryFile(dir=filename.parent) as spool,
+                temp_filename.open("xb") as f,
+            ):
+                self._build(f, spool)
+
+            os.replace(temp_filename, filename)
+        except BaseException:
+            temp_filename.unlink(missing_ok=True)
+            raise
 
         return filename
@@ -0,0 +1,151 @@
+"""
+``importlib.resources`` support of the baked packages.
+
+Resources are read from the reader of the baked package, so with the
+loader (which maps packages into memory) they are copied straight from
+the mapping and never extracted to disk
+"""
+
+import io
+from typing import Iterator
+
+try:
+    from importlib.resources.abc import Traversable, TraversableResources
+except ImportError:  # Python < 3.11
+    from importlib.abc import Traversable, TraversableResources
+
+from .bakedreader import BakedReader, ReaderRegistry
+
+
+class BakedTraversable(Traversable):
+    """
+    Resource file or directory inside the baked package
+    """
+
+    def __init__(
+        self,
+        reader: BakedReader,
+        path: str,
+        verify: bool = False,
+        registry: ReaderRegistry | None = None,
+    ):
+        """
+        :param reader: Reader of the baked package
+        :param path: path inside the baked file
+            (see BakedReader.inner_path, empty string is the root of the file)
+        :param verify: Verify resources against their digests when read
+        :param registry: Registry to reopen the reader from when it is closed
+        """
+        self._reader = reader
+        self.path = path
+        self.verify = verify
+        self.registry = registry
+
+    @property
+    def reader(self) -> BakedReader:
+        # Registry closes least recently used readers,
+        # resource may be read long after it was found
+        if self.registry is not None:
+            self._reader = self.registry.reopen(self._reader)
+
+        return self._reader
+
+    @property
+    def name(self) -> str:
+        if not self.path:
+            return self.reader.name
+
+        return self.path.rsplit("/", 1)[-1]
+
+    def _child(self, name: str) -> "BakedTraversable":
+        path = self.path + "/" + name if self.path else name
+
+        return BakedTraversable(self.reader, path, self.verify, self.registry)
+
+    def iterdir(self) -> Iterator["BakedTraversable"]:
+        prefix = self.path + "/" if self.path else ""
+
+        # Names of the files and directories directly inside this
+        # directory (dict keeps order of the resources)
+        children = {}
+        for path in self.reader.resources:
+            if path.startswith(prefix):
+                children[path[len(prefix) :].split("/", 1)[0]] = None
+
+        return map(self._child, children)
+
+    def is_dir(self) -> bool:
+        if not self.path or self.reader.is_resource_dir(self.path):
+            return True
+
+        # Subpackages are directories even without resources
+        return self.reader.is_package(self.reader.import_name(self.path))
+
+    def is_file(self) -> bool:
+        return (
+            bool(self.path) and self.reader.find_resource(self.path) is not None
+        )
+
+    def joinpath(self, *descendants: str) -> "BakedTraversable":
+        traversable = self
+
+        for descendant in descendants:
+            for name in str(descendant).split("/"):
+                if name:
+                    traversable = traversable._child(name)
+
+        return traversable
+
+    def read_bytes(self) -> bytes:
+        data = self.reader.read_resource(self.path, self.verify)
+
+        if data is None:
+            raise FileNotFoundError(
+                f"Resource {self.path} not found in {self.reader.path}"
+            )
+
+        return bytes(data)
+
+    def open(self, mode: str = "r", *args, **kwargs):
+        if mode not in ("r", "rb"):
+            raise ValueError(f"Unsupported mode for baked resource: {mode}")
+
+        stream = io.BytesIO(self.read_bytes())
+
+        if mode == "rb":
+            return stream
+
+        return io.TextIOWrapper(stream, *args, **kwargs)
+
+    def __repr__(self):
+        return f"<BakedTraversable {self.reader.path}:{self.path}>"
+
+
+class BakedResources(TraversableResources):
+    """
+    Resource reader of the baked package (or subpackage)
+    """
+
+    def __init__(
+        self,
+        reader: BakedReader,
+        path: str,
+        verify: bool = False,
+        registry: ReaderRegistry | None = None,
+    ):
+        """
+        :param reader: Reader of the baked package
+        :param path: package path inside the baked file
+            (see BakedReader.inner_path)
+        :param verify: Verify resources against their digests when read
+        :param registry: Registry to reopen the reader from when it is closed
+        """
+        self.reader = reader
+        self.path = path
+        self.verify = verify
+        self.registry = registry
+
+    def files(self) -> BakedTraversable:
+        return BakedTraversable(
+            self.reader, self.path, self.verify, self.registry
+        )
@@ -0,0 +1,184 @@
+"""
+Site index of the baked files.
+
+Index is written into the directory by ``baked-index`` and maps top-level
+packages of all baked files inside the directory to these files, so finder
+does not open every baked file to know which packages it holds.
+Index is ignored when baked files of the directory are added, removed
+or modified after it was written
+"""
+
+import logging
+import mmap
+import os
+import secrets
+import struct
+from pathlib import Path
+from typing import Any
+
+from . import protocol
+from .bakedreader import BakedReader
+
+logger = logging.getLogger(__name__)
+
+
+def _stat(path: Path) -> tuple[int, int]:
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build(directory: str | Path) -> dict[str, Any]:
+    """
+    Read all baked files of the directory
+
+    :param directory: directory with baked files
+    :return: index data {"archives": {file_name: {"mtime", "size", "hash",
+        "packages"}}, "packages": {package_name: file_name}}
+    """
+    directory = Path(directory)
+
+    archives = {}
+    packages = {}
+
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(protocol.EXTENSION):
+            continue
+
+        path = directory / name
+        mtime, size = _stat(path)
+
+        try:
+            with BakedReader(path) as reader:
+                content_hash = reader.real_hash
+                roots = reader.roots
+        except ValueError as e:
+            raise ValueError(f"Cannot read {name}: {e}") from e
+
+        archives[name] = {
+            "mtime": mtime,
+            "size": size,
+            "hash": content_hash,
+            "packages": list(roots),
+        }
+
+        # The first file holding the package wins, as in the finder
+        for package in roots:
+            packages.setdefault(package, name)
+
+        logger.debug(f"Indexed {name} => {roots}")
+
+    return {"archives": archives, "packages": packages}
+
+
+def write(directory: str | Path, data: dict[str, Any] = None) -> Path:
+    """
+    Write site index into the directory.
+    Index is written into a temporary file that replaces the previous one
+
+    :param directory: directory with baked files
+    :param data: index data (built from the directory by default)
+    :return: path to the index file
+    """
+    directory = Path(directory)
+
+    if data is None:
+        data = build(directory)
+
+    filename = directory / protocol.SITE_INDEX
+    temp_filename = filename.with_name(
+        f".{filename.name}.{secrets.token_hex(4)}.tmp"
+    )
+
+    try:
+        with temp_filename.open("xb") as f:
+            protocol.write_version(
+                f, protocol.SITE_VERSION, protocol.SITE_SIGNATURE
+            )
+            protocol.write_message(f, protocol.serialize(data))
+
+        os.replace(temp_filename, filename)
+    except BaseException:
+        temp_filename.unlink(missing_ok=True)
+        raise
+
+    return filename
+
+
+def read(path: str | Path) -> dict[str, Any]:
+    """
+    Read site index file
+
+    :param path: path to the index file
+    :return: index data (see build)
+    """
+    with (
+        open(path, "rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        signature, version = protocol.VERSION_HEADER.unpack_from(data)
+
+        if signature != protocol.SITE_SIGNATURE:
+            raise ValueError("Cannot decode site index: signature not found")
+
+        if version > protocol.SITE_VERSION:
+            raise ValueError(
+                f"Cannot decode site index: unsupported version {version}"
+            )
+
+        message = protocol.view_message(data, protocol.VERSION_HEADER.size)
+
+        try:
+            return protocol.deserialize(message)
+        finally:
+            message.release()
+
+
+def load(directory: str) -> dict[str, Path] | None:
+    """
+    Load site index of the directory
+
+    :param directory: directory path
+    :return: mapping {package_name: baked_file_path} or None if directory
+        has no index, or index is outdated or corrupt
+    """
+    path = Path(directory, protocol.SITE_INDEX)
+
+    try:
+        data = read(path)
+        archives = data["archives"]
+        packages = data["packages"]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, KeyError, struct.error) as e:
+        # Truncated or corrupt index - directory is listed instead
+        logger.debug(f"Cannot read site index {path}: {e}")
+        return None
+
+    try:
+        files = {
+            name
+            for name in os.listdir(directory or ".")
+            if name.endswith(protocol.EXTENSION)
+        }
+
+        # Baked files were added or removed after index was written
+        if files != archives.keys():
+            logger.debug(f"Site index {path} is outdated: files changed")
+            return None
+
+        for name, archive in archives.items():
+            if _stat(Path(directory, name)) != (
+                archive["mtime"],
+                archive["size"],
+            ):
+                logger.debug(f"Site index {path} is outdated: {name} changed")
+                return None
+
+        return {
+            package: Path(directory, name)
+            for package, name in packages.items()
+        }
+    except (OSError, TypeError, KeyError, AttributeError) as e:
+        logger.debug(f"Cannot check site index {path}: {e}")
+        return None
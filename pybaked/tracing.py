@@ -0,0 +1,97 @@
+"""
+Import tracing of baked modules.
+
+Trace is the list of baked modules in order of their first execution by the
+loader. Baked file built with the trace as layout (see BakedMaker.layout or
+``baked-make --layout``) keeps these modules contiguously at the front of
+the file, so cold start reads it sequentially.
+
+Call ``start`` and ``stop`` to record the trace, or set ``PYBAKED_TRACE``
+environment variable to the path of the trace file written at exit
+"""
+
+import atexit
+import os
+import threading
+from pathlib import Path
+
+ENV_VARIABLE = "PYBAKED_TRACE"
+
+_lock = threading.Lock()
+
+# Module names in order of the first execution (dict is an ordered set)
+_trace: dict[str, None] | None = None
+
+
+def start():
+    """
+    Start recording the trace (previous trace is dropped)
+    """
+    global _trace
+
+    with _lock:
+        _trace = {}
+
+
+def stop() -> list[str]:
+    """
+    Stop recording the trace
+
+    :return: module names in order of the first execution
+    """
+    global _trace
+
+    with _lock:
+        trace, _trace = _trace, None
+
+    return list(trace or ())
+
+
+def active() -> bool:
+    return _trace is not None
+
+
+def record(name: str):
+    """
+    Record execution of the module
+    """
+    with _lock:
+        if _trace is not None:
+            _trace.setdefault(name, None)
+
+
+def write(path: str | Path, modules: list[str]):
+    """
+    Write trace file: one module name per line
+
+    :param path: trace file path
+    :param modules: module names in order of the first execution
+    """
+    Path(path).write_text("".join(name + "\n" for name in modules))
+
+
+def read(path: str | Path) -> list[str]:
+    """
+    Read trace file
+
+    :param path: trace file path
+    :return: module names in order of the first execution
+    """
+    return [
+        name
+        for name in map(str.strip, Path(path).read_text().splitlines())
+        if name
+    ]
+
+
+def _install_from_environment():
+    destination = os.environ.get(ENV_VARIABLE)
+
+    if not destination:
+        return
+
+    start()
+    atexit.register(lambda: write(destination, stop()))
+
+
+_install_from_environment()
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import datetime
 import pathlib
 import shutil
@@ -6,7 +7,7 @@ from typing import Any
 
 import pytest
 
-from pybaked import BakedMaker
+from pybaked import BakedMaker, BakedReader, protocol
 
 
 @pytest.fixture
@@ -107,3 +108,182 @@ def temp_baked_package_metadata(temp_dir, temp_default_package, test_metadata):
     yield package_path
 
     os.remove(package_path)
+
+
+@pytest.fixture
+def temp_baked_package_bytecode(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, bytecode=True
+    ).file(temp_dir / "temp_baked_package_bytecode")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+def write_legacy_package(path: pathlib.Path, modules: dict[bytes, bytes]):
+    """
+    Write baked package in the format version 1
+    (length-prefixed fragment names and offsets)
+    """
+    fragments = b""
+    offset = sum(len(name) + 24 for name in modules)
+    for name, source in modules.items():
+        fragments += protocol.pack_message(name)
+        fragments += protocol.pack_message(offset.to_bytes(8, "little"))
+        offset += len(source) + 8
+
+    for source in modules.values():
+        fragments += protocol.pack_message(source)
+
+    content_hash = hashlib.sha256(
+        b"".join(name + source for name, source in modules.items())
+    ).digest()
+
+    path.write_bytes(
+        protocol.pack_message(protocol.serialize(datetime.datetime.now()))
+        + protocol.pack_message(protocol.serialize({"--fh": content_hash}))
+        + fragments
+    )
+
+
+@pytest.fixture
+def temp_baked_package_legacy(temp_dir, temp_default_package):
+    package_path = temp_dir / ("temp_baked_package_legacy" + protocol.EXTENSION)
+
+    write_legacy_package(
+        package_path,
+        {
+            module_file.stem.encode(): module_file.read_bytes()
+            for module_file in sorted(temp_default_package.glob("*.py"))
+        },
+    )
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+@pytest.fixture
+def temp_baked_package_compressed(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, compression="zlib", bytecode=True
+    ).file(temp_dir / "temp_baked_package_compressed")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+def _corrupt_module(package_path: pathlib.Path, module_name: str):
+    """
+    Change first byte of the module body in baked package
+    """
+    reader = BakedReader(package_path)
+    offset = reader.find(reader.name + "." + module_name) + 8
+    del reader
+
+    with package_path.open("r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+@pytest.fixture
+def corrupt_module():
+    return _corrupt_module
+
+
+@pytest.fixture
+def temp_baked_package_profiled(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, hash_content=True, compression="zlib"
+    ).file(temp_dir / "temp_baked_package_profiled")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+@pytest.fixture
+def temp_baked_package_resources(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, resources=True
+    ).file(temp_dir / "temp_baked_package_resources")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+@pytest.fixture
+def archive_packages() -> list[str]:
+    return ["archive_first", "archive_second"]
+
+
+@pytest.fixture
+def temp_baked_archive(temp_dir, archive_packages):
+    sources = temp_dir / "archive_sources"
+
+    for package in archive_packages:
+        (sources / package / "sub").mkdir(parents=True)
+        (sources / package / "__init__.py").write_text("ROOT = __name__")
+        (sources / package / "sub" / "module.py").write_text("NAME = __name__")
+        (sources / package / "sub" / "data.txt").write_text(package)
+
+    package_path = BakedMaker.from_packages(
+        [sources / package for package in archive_packages],
+        hash_content=True,
+        resources=True,
+    ).file(temp_dir / "temp_baked_archive")
+
+    yield package_path
+
+    os.remove(package_path)
+    shutil.rmtree(sources)
+
+
+@pytest.fixture
+def temp_baked_package_lazy(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, metadata={"--lazy": True}
+    ).file(temp_dir / "temp_baked_package_lazy")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+@pytest.fixture
+def threaded_modules() -> dict[str, bytes]:
+    # Bodies of different sizes, so wrong ranges are never valid modules
+    return {
+        f"module{i}": f"VALUE = {i}\nPADDING = {'x' * i * 97!r}\n".encode()
+        for i in range(64)
+    }
+
+
+@pytest.fixture
+def temp_baked_package_threaded(temp_dir, threaded_modules):
+    maker = BakedMaker(hash_content=True)
+
+    for name, source in threaded_modules.items():
+        maker.include_module(name.encode(), source)
+
+    package_path = maker.file(temp_dir / "temp_baked_package_threaded")
+
+    yield package_path
+
+    os.remove(package_path)
+
+
+@pytest.fixture
+def temp_baked_package_preload(temp_dir, temp_default_package):
+    package_path = BakedMaker.from_package(
+        temp_default_package, hash_content=True
+    ).file(temp_dir / "temp_baked_package_preload")
+
+    yield package_path
+
+    os.remove(package_path)
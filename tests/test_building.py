@@ -1,6 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import logging
+import os
+import threading
 
-from pybaked import BakedReader
+import pytest
+
+from pybaked import (
+    BakedMaker,
+    BakedReader,
+    loader,
+    protocol,
+    pybaker,
+    siteindex,
+)
+from pybaked.bakedreader import MODULE, PACKAGE, ReaderRegistry
 
 
 def test_default(temp_baked_package, test_files):
@@ -32,3 +46,580 @@ def test_hash(temp_baked_package_hashed):
     reader = BakedReader(temp_baked_package_hashed)
 
     assert reader.hash_match is True
+
+
+def test_bytecode(temp_baked_package_bytecode):
+    reader = BakedReader(temp_baked_package_bytecode)
+
+    assert reader.bytecode_dict.keys() == reader.modules_dict.keys()
+
+
+def test_bytecode_magic_mismatch(temp_baked_package_bytecode, monkeypatch):
+    monkeypatch.setattr(protocol, "MAGIC_NUMBER", b"\x00\x00\r\n")
+
+    reader = BakedReader(temp_baked_package_bytecode)
+
+    assert reader.bytecode_dict == {}
+
+
+def test_index_lookup(temp_baked_package, temp_default_package):
+    reader = BakedReader(temp_baked_package)
+
+    assert reader.version == protocol.VERSION
+
+    for module_file in temp_default_package.glob("*.py"):
+        offset = reader.find(reader.name + "." + module_file.stem)
+
+        assert offset is not None
+        assert reader.read_specific(offset) == module_file.read_bytes()
+
+    assert reader.find(reader.name + ".missing") is None
+    assert reader.find("missing.test0") is None
+
+    # Items are read in one pass in the index order
+    index = reader.index
+    assert list(index.items()) == [(name, index[name]) for name in index]
+    assert len(index.items()) == len(index)
+
+
+def test_legacy_format(temp_baked_package_legacy, temp_default_package):
+    reader = BakedReader(temp_baked_package_legacy)
+
+    assert reader.version == 1
+    assert reader.hash_match is True
+
+    for module_file in temp_default_package.glob("*.py"):
+        module_name = reader.name + "." + module_file.stem
+
+        assert module_name in reader.modules_dict
+        assert (
+            reader.read_specific(reader.find(module_name))
+            == module_file.read_bytes()
+        )
+
+
+def test_mmap(temp_baked_package_hashed, temp_default_package):
+    reader = BakedReader(temp_baked_package_hashed, use_mmap=True)
+
+    assert reader.mapped
+    assert reader.hash_match is True
+
+    for module_file in temp_default_package.glob("*.py"):
+        body = reader.read_specific(
+            reader.find(reader.name + "." + module_file.stem)
+        )
+
+        assert isinstance(body, memoryview)
+        assert body == module_file.read_bytes()
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma", "bz2"])
+def test_compression(temp_dir, temp_default_package, compression):
+    # Compressible module
+    (temp_default_package / "large.py").write_text("VALUE = 1\n" * 1000)
+
+    package_path = BakedMaker.from_package(
+        temp_default_package, hash_content=True, compression=compression
+    ).file(temp_dir / "temp_baked_package_compression")
+
+    reader = BakedReader(package_path)
+
+    assert reader.hash_match is True
+    assert package_path.stat().st_size < 10000
+
+    for module_file in temp_default_package.glob("*.py"):
+        module_name = reader.name + "." + module_file.stem
+
+        assert reader.read(module_name) == module_file.read_bytes()
+
+    # Codec is kept when the package is rebuilt
+    assert reader.compression == compression
+    rebuilt = BakedReader(reader.to_maker().file(temp_dir / "rebuilt"))
+    assert rebuilt.compression == compression
+
+
+def test_compression_unsupported():
+    with pytest.raises(ValueError):
+        BakedMaker(compression="unknown")
+
+
+def test_parallel(temp_dir, temp_default_package):
+    for i in range(20):
+        (temp_default_package / f"module{i}.py").write_text(f"VALUE = {i}\n")
+
+    serial = BakedMaker.from_package(
+        temp_default_package, True, bytecode=True, compression="zlib"
+    ).file(temp_dir / "temp_baked_package_serial")
+    parallel = BakedMaker.from_package(
+        temp_default_package, True, bytecode=True, compression="zlib", workers=4
+    ).file(temp_dir / "temp_baked_package_parallel")
+
+    serial_reader = BakedReader(serial)
+    parallel_reader = BakedReader(parallel)
+
+    assert serial_reader.metadata == parallel_reader.metadata
+    assert [
+        (name, serial_reader.read_specific(offset))
+        for name, offset in serial_reader.fragments
+    ] == [
+        (name, parallel_reader.read_specific(offset))
+        for name, offset in parallel_reader.fragments
+    ]
+
+
+def test_file_replace(temp_dir, temp_baked_package):
+    BakedMaker().include_module(b"module", b"VALUE = 1").file(
+        temp_baked_package
+    )
+
+    reader = BakedReader(temp_baked_package)
+
+    assert list(reader.modules_dict) == [reader.name + ".module"]
+    assert [path.name for path in temp_dir.iterdir() if path.is_file()] == [
+        temp_baked_package.name
+    ]
+
+
+def test_lazy_verification(temp_baked_package_hashed, corrupt_module):
+    reader = BakedReader(temp_baked_package_hashed)
+    module_name = reader.name + ".test0"
+
+    assert reader.index_hash_match is True
+    assert reader.read(module_name, verify=True) is not None
+
+    corrupt_module(temp_baked_package_hashed, "test0")
+
+    reader = BakedReader(temp_baked_package_hashed)
+
+    # Index is intact, only module body is corrupted
+    assert reader.index_hash_match is True
+    assert reader.hash_match is False
+
+    with pytest.raises(ValueError):
+        reader.read(module_name, verify=True)
+
+    assert reader.read(reader.name + ".test1", verify=True) is not None
+
+
+def test_serialization(test_metadata):
+    data = {
+        "nested": {"metadata": test_metadata, "list": [test_metadata, []]},
+        "bytes": b"\x00/bytes",
+        "empty": {},
+    }
+
+    assert protocol.deserialize(protocol.serialize(data)) == data
+    assert protocol.deserialize(memoryview(protocol.serialize(data))) == data
+
+    with pytest.raises(TypeError):
+        protocol.serialize({"unsupported": object()})
+
+
+def test_lazy_metadata(temp_baked_package_metadata, test_metadata):
+    reader = BakedReader(temp_baked_package_metadata)
+    metadata = reader.metadata
+
+    # Values are not deserialized until they are accessed
+    assert not metadata._values
+    assert set(metadata) == set(test_metadata)
+    assert not metadata._values
+
+    key = next(iter(test_metadata))
+    assert metadata[key] == test_metadata[key]
+    assert list(metadata._values) == [key]
+
+    assert metadata == test_metadata
+    assert reader.metadata is metadata
+
+    with pytest.raises(TypeError):
+        metadata[key] = None
+
+    with pytest.raises(KeyError):
+        metadata["missing"]
+
+
+def test_resources(temp_baked_package_resources, test_files):
+    reader = BakedReader(temp_baked_package_resources)
+
+    resources = [file for file in test_files if not file.endswith(".py")]
+
+    assert reader.resources == resources
+    assert len(reader.modules) == len(test_files) - len(resources)
+
+    for resource in resources:
+        assert reader.find_resource(resource) is not None
+        assert reader.read_resource(resource, verify=True) == (
+            f"Not python module {resource}".encode()
+        )
+
+    assert reader.read_resource("missing") is None
+
+    # Resources are kept when package is rebuilt
+    assert reader.to_maker().bytes().count(b"Not python module") == len(
+        resources
+    )
+
+
+def test_resources_nested(temp_dir):
+    package_path = (
+        BakedMaker(compression="zlib")
+        .include_module(b"__init__", b"")
+        .include_resource("data/schema.json", b"{}" * 100)
+        .include_resource("data/nested/file.txt", b"text")
+        .file(temp_dir / "nested_resources")
+    )
+
+    reader = BakedReader(package_path, use_mmap=True)
+
+    assert reader.is_resource_dir("")
+    assert reader.is_resource_dir("data")
+    assert reader.is_resource_dir("data/nested")
+    assert not reader.is_resource_dir("data/schema.json")
+
+    assert reader.read_resource("data/schema.json") == b"{}" * 100
+
+    # Uncompressed resource is a slice of the mapping
+    assert isinstance(reader.read_resource("data/nested/file.txt"), memoryview)
+
+
+def test_multi_package(temp_dir, temp_baked_archive, archive_packages):
+    reader = BakedReader(temp_baked_archive)
+
+    assert reader.roots == tuple(archive_packages)
+    assert reader.hash_match
+
+    for package in archive_packages:
+        assert package in reader.packages
+        assert package + ".sub" in reader.packages
+        assert reader.is_package(package + ".sub")
+        assert reader.read(package + ".sub.module") == b"NAME = __name__"
+        assert reader.inner_path(package + ".sub.module") == (
+            package + "/sub/module"
+        )
+        assert reader.import_name(package + "/sub") == package + ".sub"
+        assert reader.read_resource(package + "/sub/data.txt") == (
+            package.encode()
+        )
+
+    # Archive is not a package itself
+    assert reader.find(reader.name + ".sub.module") is None
+
+    rebuilt = BakedReader(reader.to_maker().file(temp_dir / "rebuilt"))
+
+    assert rebuilt.roots == reader.roots
+    assert rebuilt.modules_dict.keys() == reader.modules_dict.keys()
+    assert rebuilt.resources == reader.resources
+
+
+def test_multi_package_duplicate(temp_dir, temp_default_package):
+    with pytest.raises(ValueError):
+        BakedMaker.from_packages([temp_default_package, temp_default_package])
+
+
+def test_site_index(
+    temp_dir, temp_baked_package, temp_baked_archive, archive_packages
+):
+    path = siteindex.write(temp_dir)
+    data = siteindex.read(path)
+
+    assert data["archives"][temp_baked_archive.name]["hash"] == (
+        BakedReader(temp_baked_archive).real_hash
+    )
+
+    packages = siteindex.load(str(temp_dir))
+
+    assert packages == {
+        **{package: temp_baked_archive for package in archive_packages},
+        BakedReader(temp_baked_package).name: temp_baked_package,
+    }
+
+    # Index is outdated when indexed file is modified
+    stat = os.stat(temp_baked_package)
+    os.utime(temp_baked_package, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert siteindex.load(str(temp_dir)) is None
+
+    # or new baked file is added
+    siteindex.write(temp_dir)
+    assert siteindex.load(str(temp_dir)) is not None
+
+    BakedMaker().include_module(b"module", b"").file(temp_dir / "added")
+
+    assert siteindex.load(str(temp_dir)) is None
+
+    os.remove(path)
+    os.remove(temp_dir / ("added" + protocol.EXTENSION))
+
+
+def test_reader_registry(temp_dir):
+    paths = [
+        BakedMaker().include_module(b"module", b"").file(temp_dir / f"r{i}")
+        for i in range(3)
+    ]
+
+    registry = ReaderRegistry(max_open=2)
+
+    first = registry.get(paths[0])
+    assert registry.get(paths[0]) is first
+
+    registry.get(paths[1])
+    registry.get(paths[2])
+
+    # Least recently used reader is closed
+    assert first.closed
+    assert paths[0] not in registry
+    assert len(registry) == 2
+
+    # Loader reopens reader closed by the registry
+    baked_loader = loader.BakedLoader(first, "r0.module", registry=registry)
+    assert not baked_loader.reader.closed
+    assert baked_loader.reader.read("r0.module") == b""
+
+    # Replaced file is reopened
+    reader = registry.get(paths[2])
+    BakedMaker().include_module(b"module", b"new").file(paths[2])
+
+    assert registry.get(paths[2]).read("r2.module") == b"new"
+    assert reader.closed
+
+    registry.invalidate()
+    assert len(registry) == 0
+
+    with pytest.raises(ValueError):
+        ReaderRegistry(max_open=0)
+
+
+def test_lookup(temp_dir):
+    reader = BakedReader(
+        BakedMaker()
+        .include_module(b"__init__", b"init")
+        .include_module(b"a.b.module", b"module")
+        .file(temp_dir / "lookup")
+    )
+
+    # Parents without __init__ module are packages too
+    assert reader.is_package("lookup")
+    assert reader.is_package("lookup.a")
+    assert not reader.is_package("lookup.a.b.module")
+    assert not reader.is_package("other")
+
+    # Package membership is looked up in the index without listing modules
+    assert "modules" not in reader.__dict__
+    assert reader.packages == ["lookup", "lookup.a", "lookup.a.b"]
+
+    package = reader.lookup("lookup")
+    assert package.kind == PACKAGE
+    assert package.module_name == "lookup.__init__"
+    assert package.offset == reader.find("lookup.__init__")
+    assert package.length == len(b"init")
+
+    assert reader.lookup("lookup.a") == (
+        PACKAGE,
+        "lookup.a.__init__",
+        None,
+        None,
+    )
+
+    module = reader.lookup("lookup.a.b.module")
+    assert module.kind == MODULE
+    assert reader.read_specific(module.offset) == b"module"
+    assert module.length == len(b"module")
+
+    assert reader.lookup("lookup.missing") is None
+    assert reader.lookup("other.module") is None
+
+
+def test_incremental(temp_dir, temp_default_package, monkeypatch):
+    package_path = temp_dir / ("incremental" + protocol.EXTENSION)
+
+    def bake():
+        return BakedReader(
+            BakedMaker.from_package(
+                temp_default_package,
+                hash_content=True,
+                bytecode=True,
+                compression="zlib",
+                resources=True,
+            )
+            .incremental(package_path)
+            .file(package_path)
+        )
+
+    # Previous file does not exist - full build tracking the sources
+    first = bake()
+    modules = {name: bytes(first.read(name)) for name in first.modules_dict}
+    assert "test1" in first.sources
+    assert "--sources" not in first.metadata
+
+    prepared = []
+    prepare_module = pybaker.prepare_module
+
+    def prepare_module_spy(import_name, *args):
+        prepared.append(import_name)
+        return prepare_module(import_name, *args)
+
+    monkeypatch.setattr(pybaker, "prepare_module", prepare_module_spy)
+
+    changed = temp_default_package / "test1.py"
+    changed.write_text("print('changed')")
+
+    # Only changed module is prepared again
+    second = bake()
+    assert prepared == [b"test1"]
+    assert second.hash_match
+
+    for name, source in modules.items():
+        if name.endswith(".test1"):
+            source = b"print('changed')"
+
+        assert second.read(name, verify=True) == source
+        assert second.read_bytecode(name, verify=True) is not None
+
+    assert second.resources == first.resources
+
+    # Modified file with the same content is not prepared again
+    prepared.clear()
+    stat = os.stat(changed)
+    os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    third = bake()
+    assert prepared == []
+    assert third.sources["test1"][0] == stat.st_mtime_ns + 1
+    assert third.read(second.name + ".test1") == b"print('changed')"
+
+
+def test_layout(temp_dir):
+    trace = ["layout.sub.module3", "other.module", "layout", "layout.module1"]
+
+    path = temp_dir / ("layout" + protocol.EXTENSION)
+
+    def bake(build):
+        maker = BakedMaker(hash_content=True, bytecode=True)
+
+        for name in ("__init__", "module1", "module2", "sub.module3"):
+            maker.include_module(name.encode(), f"NAME = {name!r}".encode())
+
+        build(maker.layout(trace, "layout"))
+        return BakedReader(path)
+
+    # Spool of the bytes is in memory, spool of the file is a real file
+    for reader in (
+        bake(lambda maker: path.write_bytes(maker.bytes())),
+        bake(lambda maker: maker.file(path)),
+    ):
+        assert reader.hash_match
+
+        offsets = []
+        for name in (b"sub.module3", b"__init__", b"module1"):
+            bytecode = reader.index.locate(
+                protocol.bytecode_fragment_name(name)
+            )
+            source = reader.index.locate(name)
+
+            # Bytecode is read by the loader, so it goes before the source
+            offsets += [bytecode.offset, source.offset]
+
+        # Traced modules are placed first in order of the first use
+        assert offsets == sorted(offsets)
+        assert offsets[-1] < reader.index.locate(b"module2").offset
+
+        for name in ("__init__", "module1", "module2", "sub.module3"):
+            assert bytes(reader.read("layout." + name, verify=True)) == (
+                f"NAME = {name!r}".encode()
+            )
+
+
+def test_layout_nested(temp_dir, caplog):
+    def bake(trace):
+        maker = BakedMaker()
+
+        for name in ("__init__", "module1", "module2", "sub.module3"):
+            maker.include_module(name.encode(), f"NAME = {name!r}".encode())
+
+        return BakedReader(maker.layout(trace, "layout").file(path))
+
+    path = temp_dir / ("layout" + protocol.EXTENSION)
+
+    # Package is imported as a subpackage of the normal package
+    reader = bake(["outer.layout.sub.module3", "outer.layout.module2"])
+
+    assert (
+        reader.index.locate(b"sub.module3").offset
+        < reader.index.locate(b"module2").offset
+        < reader.index.locate(b"__init__").offset
+    )
+
+    with caplog.at_level(logging.WARNING):
+        bake(["outer.other.module1"])
+
+    assert "layout is not applied" in caplog.text
+
+
+def test_prefetch(temp_baked_package, test_files):
+    package_name = temp_baked_package.name.split(".", 1)[0]
+    modules = [
+        package_name + "." + file[:-3]
+        for file in test_files
+        if file.endswith(".py")
+    ]
+
+    for use_mmap in (True, False):
+        with BakedReader(temp_baked_package, use_mmap=use_mmap) as reader:
+            sizes = [
+                protocol.LENGTH.size + reader.lookup(name).length
+                for name in modules
+            ]
+
+            # Bodies of the modules are adjacent - prefetched at once
+            assert reader.prefetch(modules) == sum(sizes)
+            assert reader.prefetch(["other.module", package_name]) == 0
+
+
+def test_threaded_reads(temp_baked_package_threaded, threaded_modules):
+    package_name = temp_baked_package_threaded.name.split(".", 1)[0]
+
+    for use_mmap in (True, False):
+        reader = BakedReader(temp_baked_package_threaded, use_mmap=use_mmap)
+        barrier = threading.Barrier(16)
+
+        def read(shift: int) -> list[bool]:
+            names = list(threaded_modules)
+            names = names[shift:] + names[:shift]
+
+            barrier.wait()
+
+            return [
+                bytes(reader.read(package_name + "." + name, verify=True))
+                == threaded_modules[name]
+                for _ in range(20)
+                for name in names
+            ]
+
+        # Threads read the same file at once, each at its own offsets
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(read, range(0, 64, 4)))
+
+        assert all(all(result) for result in results)
+
+        reader.close()
+
+
+def test_locate(temp_baked_package_resources, temp_default_package):
+    reader = BakedReader(temp_baked_package_resources)
+    package_name = reader.name
+
+    source = (temp_default_package / "test0.py").read_bytes()
+    location = reader.locate(package_name + ".test0")
+
+    # Digest of the uncompressed body is the digest of the module file
+    assert location.length == len(source)
+    assert location.digest == protocol.fragment_digest(source)
+    assert location.flags & protocol.CODEC_MASK == 0
+
+    resource = (temp_default_package / "test2.png").read_bytes()
+    location = reader.locate_resource("test2.png")
+    assert location.digest == protocol.fragment_digest(resource)
+
+    assert reader.locate(package_name + ".missing") is None
+    assert reader.locate("other.test0") is None
+    assert reader.locate_resource("missing.txt") is None
@@ -1,6 +1,14 @@
 import contextlib
 import importlib
+import importlib.resources
+import importlib.util
 import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
 
 import pybaked
 
@@ -47,6 +55,8 @@ def test_loading_metadata(
 
     package_name = ".".join(relative_package_path.parts)
 
+    metadata = []
+
     for file in test_files:
         # Only python modules are included into package
         if not file.endswith(".py"):
@@ -59,3 +69,533 @@ def test_loading_metadata(
         module = importlib.import_module(import_name)
 
         assert module.__baked_metadata__ == test_metadata
+        metadata.append(module.__baked_metadata__)
+
+    # All modules share the same read-only metadata
+    assert all(m is metadata[0] for m in metadata)
+
+
+def test_loading_bytecode(
+    temp_dir,
+    temp_baked_package_bytecode,
+    test_files,
+    python_module_stdout_template,
+):
+    pybaked.loader.init()
+
+    relative_package_path = temp_baked_package_bytecode.relative_to(
+        temp_dir.parent
+    ).with_name(temp_baked_package_bytecode.name.split(".", 1)[0])
+
+    package_name = ".".join(relative_package_path.parts)
+
+    for file in test_files:
+        # Only python modules are included into package
+        if not file.endswith(".py"):
+            continue
+
+        module_name = file[:-3]
+
+        import_name = package_name + "." + module_name
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout):
+            module = importlib.import_module(import_name)
+
+        assert (
+            stdout.getvalue()
+            == python_module_stdout_template.format(file=file) + "\n"
+        )
+        assert module.__file__.startswith(str(temp_baked_package_bytecode))
+
+
+def test_loading_compressed(
+    temp_dir,
+    temp_baked_package_compressed,
+    test_files,
+    python_module_stdout_template,
+):
+    pybaked.loader.init()
+
+    relative_package_path = temp_baked_package_compressed.relative_to(
+        temp_dir.parent
+    ).with_name(temp_baked_package_compressed.name.split(".", 1)[0])
+
+    package_name = ".".join(relative_package_path.parts)
+
+    for file in test_files:
+        # Only python modules are included into package
+        if not file.endswith(".py"):
+            continue
+
+        module_name = file[:-3]
+
+        import_name = package_name + "." + module_name
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout):
+            module = importlib.import_module(import_name)
+
+        assert (
+            stdout.getvalue()
+            == python_module_stdout_template.format(file=file) + "\n"
+        )
+        assert module.__file__.startswith(str(temp_baked_package_compressed))
+
+
+def test_loading_resources(temp_dir, temp_baked_package_resources, test_files):
+    pybaked.loader.init()
+
+    relative_package_path = temp_baked_package_resources.relative_to(
+        temp_dir.parent
+    ).with_name(temp_baked_package_resources.name.split(".", 1)[0])
+
+    package_name = ".".join(relative_package_path.parts)
+
+    files = importlib.resources.files(package_name)
+    resources = [file for file in test_files if not file.endswith(".py")]
+
+    assert files.is_dir()
+    assert [child.name for child in files.iterdir()] == resources
+
+    for resource in resources:
+        assert files.joinpath(resource).is_file()
+        assert files.joinpath(resource).read_bytes() == (
+            f"Not python module {resource}".encode()
+        )
+        assert (files / resource).read_text() == f"Not python module {resource}"
+
+    assert not files.joinpath("missing").is_file()
+
+    with pytest.raises(FileNotFoundError):
+        files.joinpath("missing").read_bytes()
+
+
+def test_loading_resources_evicted(temp_dir):
+    names = [temp_dir.name + f".evicted{i}" for i in range(3)]
+
+    for i in range(3):
+        pybaked.BakedMaker().include_module(b"__init__", b"").include_resource(
+            "data.txt", str(i).encode()
+        ).file(temp_dir / f"evicted{i}")
+
+    pybaked.loader.init(max_open_files=1)
+    try:
+        files = importlib.resources.files(names[0])
+
+        # Reader of the first package is closed by the registry
+        importlib.import_module(names[1])
+        importlib.import_module(names[2])
+
+        assert files.joinpath("data.txt").read_bytes() == b"0"
+    finally:
+        pybaked.loader.init(max_open_files=64)
+
+
+def test_loading_multi_package(temp_dir, temp_baked_archive, archive_packages):
+    pybaked.loader.init()
+
+    finder = next(
+        finder
+        for finder in sys.meta_path
+        if isinstance(finder, pybaked.loader.BakedPathFinder)
+    )
+
+    # All packages of the archive are found in one baked file
+    finder.readers.invalidate()
+    names = finder.baked_names(str(temp_dir))
+    assert {names[package] for package in archive_packages} == {
+        temp_baked_archive
+    }
+
+    # Baked files are not kept open to list their packages
+    assert len(finder.readers) == 0
+    assert temp_baked_archive.name.split(".", 1)[0] not in names
+
+    for package in archive_packages:
+        import_name = temp_dir.name + "." + package
+
+        root = importlib.import_module(import_name)
+        module = importlib.import_module(import_name + ".sub.module")
+
+        assert root.ROOT == import_name
+        assert module.NAME == import_name + ".sub.module"
+        assert module.__file__ == str(
+            temp_baked_archive / package / "sub" / "module.py"
+        )
+        assert "--roots" in root.__baked_metadata__
+
+        assert (
+            importlib.resources.files(import_name + ".sub")
+            .joinpath("data.txt")
+            .read_text()
+            == package
+        )
+
+
+def test_loading_site_index(temp_dir, temp_baked_archive, archive_packages):
+    index_path = pybaked.siteindex.write(temp_dir)
+
+    pybaked.loader.init()
+
+    finder = next(
+        finder
+        for finder in sys.meta_path
+        if isinstance(finder, pybaked.loader.BakedPathFinder)
+    )
+
+    finder.readers.invalidate()
+    names = finder.baked_names(str(temp_dir))
+
+    # Baked files are not opened to list their packages
+    assert len(finder.readers) == 0
+    assert names == {
+        package: temp_baked_archive for package in archive_packages
+    }
+
+    spec = finder.find_spec(
+        temp_dir.name + "." + archive_packages[0] + ".sub.module", None
+    )
+    assert spec.loader.reader.path == temp_baked_archive
+
+    # Truncated index is ignored, directory is listed instead
+    index_path.write_bytes(index_path.read_bytes()[:4])
+    finder.invalidate_caches()
+
+    assert finder.baked_names(str(temp_dir)) == names
+    assert finder.find_spec(temp_dir.name + ".missing", None) is None
+
+    os.remove(index_path)
+
+
+def test_loading_lazy(
+    temp_dir,
+    temp_baked_package_lazy,
+    temp_baked_package,
+    test_files,
+    python_module_stdout_template,
+):
+    pybaked.loader.init()
+
+    package_name = (
+        temp_dir.name + "." + temp_baked_package_lazy.name.split(".")[0]
+    )
+
+    for file in test_files:
+        # Only python modules are included into package
+        if not file.endswith(".py"):
+            continue
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout):
+            module = importlib.import_module(package_name + "." + file[:-3])
+
+            # Module is executed on the first attribute access
+            assert stdout.getvalue() == ""
+            assert "--lazy" in module.__baked_metadata__
+
+        assert (
+            stdout.getvalue()
+            == python_module_stdout_template.format(file=file) + "\n"
+        )
+
+    finder = pybaked.loader._installed_finder()
+    module_name = (
+        temp_dir.name + "." + temp_baked_package.name.split(".")[0] + ".test0"
+    )
+
+    # Installed finder may load all baked packages lazily,
+    # init without options keeps the mode
+    pybaked.loader.init(lazy=True)
+    try:
+        pybaked.loader.init()
+
+        spec = finder.find_spec(module_name, None)
+        assert isinstance(spec.loader, importlib.util.LazyLoader)
+    finally:
+        pybaked.loader.init(lazy=False)
+
+    spec = finder.find_spec(module_name, None)
+    assert not isinstance(spec.loader, importlib.util.LazyLoader)
+
+
+def test_finder_miss(temp_dir, temp_baked_package):
+    finder = pybaked.loader.BakedPathFinder()
+    sys_path = list(sys.path)
+
+    assert finder.find_spec("missing_module", [str(temp_dir)]) is None
+    assert sys.path == sys_path
+
+    package_name = temp_baked_package.name.split(".", 1)[0]
+
+    assert package_name in finder.baked_names(str(temp_dir))
+
+
+def test_loading_created(temp_dir):
+    pybaked.loader.init()
+
+    import_name = temp_dir.name + ".created.module"
+
+    with pytest.raises(ImportError):
+        importlib.import_module(import_name)
+
+    # Directory is listed again when baked file is created in it
+    pybaked.BakedMaker().include_module(b"module", b"VALUE = 1").file(
+        temp_dir / "created"
+    )
+
+    assert importlib.import_module(import_name).VALUE == 1
+
+    os.remove(temp_dir / ("created" + pybaked.protocol.EXTENSION))
+
+
+def test_loading_corrupted(temp_dir, temp_baked_package_hashed, corrupt_module):
+    pybaked.loader.init()
+
+    corrupt_module(temp_baked_package_hashed, "test0")
+
+    relative_package_path = temp_baked_package_hashed.relative_to(
+        temp_dir.parent
+    ).with_name(temp_baked_package_hashed.name.split(".", 1)[0])
+
+    package_name = ".".join(relative_package_path.parts)
+
+    with pytest.raises(ImportError):
+        importlib.import_module(package_name + ".test0")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        importlib.import_module(package_name + ".test1")
+
+
+def test_profiling(temp_dir, temp_baked_package_profiled, test_files):
+    pybaked.loader.init()
+
+    relative_package_path = temp_baked_package_profiled.relative_to(
+        temp_dir.parent
+    ).with_name(temp_baked_package_profiled.name.split(".", 1)[0])
+
+    package_name = ".".join(relative_package_path.parts)
+
+    profiles = []
+    pybaked.profiling.add_hook(profiles.append)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            importlib.import_module(package_name + ".test0")
+    finally:
+        pybaked.profiling.remove_hook(profiles.append)
+
+    profile = profiles[-1]
+
+    assert profile.name == package_name + ".test0"
+    assert profile.bytes_read > 0
+    assert profile.total >= profile.execute > 0
+    assert profile.name in pybaked.profiling.format_report(profiles)
+
+
+def test_profile_import_shadowed(temp_dir):
+    from pybaked.cli.read import profile_import
+
+    # Default layout of baked-make: source package next to the baked file
+    source = temp_dir / "shadowed"
+    source.mkdir()
+    (source / "__init__.py").write_text("VALUE = 1")
+    baked = pybaked.BakedMaker.from_package(source).file(temp_dir / "shadowed")
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert profile_import(baked, None) == 0
+
+        module = sys.modules["shadowed"]
+        assert isinstance(module.__spec__.loader, pybaked.loader.BakedLoader)
+    finally:
+        sys.modules.pop("shadowed", None)
+        sys.path.remove(str(temp_dir))
+
+
+def test_loading_trace(temp_dir, temp_baked_package_resources):
+    pybaked.loader.init()
+
+    package_name = (
+        temp_dir.name + "." + temp_baked_package_resources.name.split(".")[0]
+    )
+
+    # Package may be imported by the other tests
+    for name in list(sys.modules):
+        if name.startswith(package_name):
+            del sys.modules[name]
+
+    pybaked.tracing.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            importlib.import_module(package_name + ".test1")
+            importlib.import_module(package_name + ".test0")
+            importlib.import_module(package_name + ".test1")
+    finally:
+        trace = pybaked.tracing.stop()
+
+    # Modules are recorded once, in order of the first execution
+    assert trace == [
+        package_name,
+        package_name + ".test1",
+        package_name + ".test0",
+    ]
+    assert not pybaked.tracing.active()
+
+    trace_path = temp_dir / "trace.txt"
+    pybaked.tracing.write(trace_path, trace)
+    assert pybaked.tracing.read(trace_path) == trace
+
+
+def test_loading_prefetch(temp_dir, temp_baked_package, monkeypatch):
+    package_name = temp_baked_package.name.split(".")[0]
+
+    prefetched = []
+    done = threading.Event()
+    prefetch = pybaked.BakedReader.prefetch
+
+    def prefetch_spy(reader, module_names):
+        prefetched.append(threading.current_thread())
+        prefetched.extend(module_names)
+        done.set()
+
+        return prefetch(reader, module_names)
+
+    monkeypatch.setattr(pybaked.BakedReader, "prefetch", prefetch_spy)
+
+    trace_path = temp_dir / "trace.txt"
+    pybaked.tracing.write(
+        trace_path,
+        [
+            temp_dir.name + "." + package_name,
+            temp_dir.name + "." + package_name + ".test0",
+            "other.module",
+        ],
+    )
+
+    module_name = temp_dir.name + "." + package_name + ".test1"
+
+    pybaked.loader.init()
+    finder = pybaked.loader._installed_finder()
+    finder.readers.invalidate()
+
+    assert finder.find_spec(module_name, None) is not None
+    assert prefetched == []
+
+    pybaked.loader.init(prefetch=trace_path)
+    try:
+        # Modules of the already opened baked file are prefetched
+        # in background when finder is configured
+        assert done.wait(5)
+        assert prefetched[0] is not threading.current_thread()
+        assert prefetched[1:] == [package_name, package_name + ".test0"]
+
+        # and when baked file is opened
+        prefetched.clear()
+        done.clear()
+        finder.readers.invalidate()
+
+        assert finder.find_spec(module_name, None) is not None
+        assert done.wait(5)
+        assert prefetched[1:] == [package_name, package_name + ".test0"]
+    finally:
+        pybaked.loader.init(prefetch=())
+        finder.readers.invalidate()
+
+
+def test_loading_threads(temp_dir, temp_baked_package_threaded):
+    pybaked.loader.init()
+
+    package_name = (
+        temp_dir.name + "." + temp_baked_package_threaded.name.split(".")[0]
+    )
+    barrier = threading.Barrier(16)
+
+    def load(shift: int) -> list[int]:
+        indexes = list(range(64))
+        indexes = indexes[shift:] + indexes[:shift]
+
+        barrier.wait()
+
+        return [
+            importlib.import_module(f"{package_name}.module{i}").VALUE
+            for i in indexes
+        ]
+
+    # Threads import different modules of the same baked file at once
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(load, range(0, 64, 4)))
+
+    for shift, values in zip(range(0, 64, 4), results):
+        assert values == list(range(shift, 64)) + list(range(shift))
+
+
+def test_preload(
+    temp_dir,
+    temp_baked_package_preload,
+    test_files,
+    python_module_stdout_template,
+):
+    package_name = (
+        temp_dir.name + "." + temp_baked_package_preload.name.split(".")[0]
+    )
+
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        (reader,) = pybaked.preload([temp_baked_package_preload])
+
+    # All modules are imported, index is read and hash is verified
+    modules = [file for file in test_files if file.endswith(".py")]
+    for file in modules:
+        assert package_name + "." + file[:-3] in sys.modules
+        assert python_module_stdout_template.format(file=file) in (
+            stdout.getvalue()
+        )
+
+    assert "index" in reader.__dict__
+    assert reader.index_hash_match
+
+    finder = pybaked.loader._installed_finder()
+    assert finder.reader_for(temp_baked_package_preload) is reader
+
+    assert not reader.verified
+
+    # Package is found by its import name as well. Modules that are not
+    # imported are verified at once with the whole content of the file
+    try:
+        assert pybaked.preload(
+            [package_name], import_modules=False, lazy=True
+        ) == [reader]
+        assert finder.lazy
+    finally:
+        pybaked.loader.init(lazy=False)
+
+    assert reader.verified
+
+    spec = finder.find_spec(package_name + ".test0", None)
+    assert not spec.loader.verify
+
+    with pytest.raises(ValueError):
+        pybaked.preload(["missing_baked_package"])
+
+    if not hasattr(os, "fork"):
+        return
+
+    # Forked worker reads the inherited reader
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = finder.reader_for(temp_baked_package_preload) is reader and (
+                bytes(reader.read(package_name.split(".")[1] + ".test0"))
+                == (temp_dir / "temp_package" / "test0.py").read_bytes()
+            )
+        except BaseException:
+            ok = False
+
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0